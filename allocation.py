@@ -0,0 +1,531 @@
+import asyncio
+import os
+import weakref
+from collections import defaultdict
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Booking, BookingSeries
+from inventory import RoomInfo, RoomInventory, room_inventory
+from notifications import WORKER_ID
+from recurrence import series_occurrences
+from cache import TTLCache
+from occupancy import GRID_SLOT_MINUTES, GRID_SLOTS, DayOccupancy, Slot, occupancy_index
+
+
+# Every room with a booking overlapping [start, end) on that date, answered from the
+# in-process occupancy index (one query the first time a day is needed)
+async def booked_rooms(
+    db: AsyncSession,
+    booking_date: date,
+    start: time,
+    end: time,
+    exclude_booking_id: Optional[int] = None
+) -> Set[int]:
+    day = await occupancy_index.day(db, booking_date)
+    return day.booked_rooms(start, end, exclude_booking_id)
+
+
+async def available_rooms(
+    db: AsyncSession,
+    booking_date: date,
+    start: time,
+    end: time,
+    exclude_booking_id: Optional[int] = None
+) -> List[int]:
+    inventory = await room_inventory.load(db)
+    taken = await booked_rooms(db, booking_date, start, end, exclude_booking_id)
+    return inventory.available(taken)
+
+
+# Strong validator for availability answers on `booking_date`. Changes whenever a booking on
+# that date changes (as seen by this worker) or the rooms do, and at least every
+# OCCUPANCY_INDEX_TTL seconds; the worker id keeps two workers' independent counters from ever
+# producing the same tag for different data.
+# Tags are per worker: behind a load balancer a revalidation only gets its 304 from the worker
+# that issued the tag. With several workers, run NOTIFY_BACKEND=postgres (the default on
+# PostgreSQL) so a worker hears of other workers' writes; with "local", a 304 can confirm data
+# up to OCCUPANCY_INDEX_TTL seconds out of date.
+def availability_etag(booking_date: date) -> str:
+    return f'"{WORKER_ID[:12]}-{room_inventory.generation}-{occupancy_index.version(booking_date)}"'
+
+
+# Whole-day room x slot grid: for each active room, the bitmask from DayOccupancy.slot_masks()
+# as hex (bit i = slot i). Built from the occupancy index and kept until the date's ETag changes.
+GRID_CACHE_DAYS = int(os.getenv("GRID_CACHE_DAYS", "366"))
+_grids = TTLCache(GRID_CACHE_DAYS, ttl=24 * 3600)
+
+
+async def occupancy_grid(db: AsyncSession, booking_date: date) -> Dict:
+    etag = availability_etag(booking_date)
+    cached = _grids.get(booking_date)
+    if cached is not None and cached[0] == etag:
+        return cached[1]
+
+    inventory = await room_inventory.load(db)
+    masks = (await occupancy_index.day(db, booking_date)).slot_masks()
+    grid = {
+        "date": booking_date.isoformat(),
+        "slot_minutes": GRID_SLOT_MINUTES,
+        "slots": GRID_SLOTS,
+        "rooms": {str(room.number): f"{masks.get(room.number, 0):0{GRID_SLOTS // 4}x}" for room in inventory.rooms}
+    }
+    _grids.set(booking_date, (etag, grid))
+    return grid
+
+
+# Authoritative check against the database; used under the slot lock before every write,
+# since the index of this worker may not have seen another worker's booking yet
+async def is_room_available(
+    db: AsyncSession,
+    room_number: int,
+    booking_date: date,
+    start: time,
+    end: time,
+    exclude_booking_id: Optional[int] = None
+) -> bool:
+    query = select(Booking.id).where(
+        Booking.date == booking_date,
+        Booking.room_number == room_number,
+        Booking.start_time < end,
+        Booking.end_time > start
+    )
+    if exclude_booking_id is not None:
+        query = query.where(Booking.id != exclude_booking_id)
+
+    result = await db.execute(query.limit(1))
+    if result.first() is not None:
+        return False
+
+    # Occurrences of recurring series aren't rows in bookings
+    clashes = await series_occurrences(
+        db, booking_date, booking_date,
+        BookingSeries.room_number == room_number, BookingSeries.start_time < end, BookingSeries.end_time > start
+    )
+    return not clashes
+
+
+# Same as booked_rooms(), straight from the database; confirms an index that says "full"
+async def booked_rooms_in_db(
+    db: AsyncSession,
+    booking_date: date,
+    start: time,
+    end: time,
+    exclude_booking_id: Optional[int] = None
+) -> Set[int]:
+    query = select(Booking.room_number).where(
+        Booking.date == booking_date, Booking.start_time < end, Booking.end_time > start
+    )
+    if exclude_booking_id is not None:
+        query = query.where(Booking.id != exclude_booking_id)
+    taken = set((await db.execute(query)).scalars())
+    taken.update(
+        occurrence.room_number for occurrence in await series_occurrences(
+            db, booking_date, booking_date, BookingSeries.start_time < end, BookingSeries.end_time > start
+        )
+    )
+    return taken
+
+
+# ------------------- Reservations -------------------
+# Writers are serialized per (date, room): the free-room check and the write happen under a
+# lock that is held until commit. PostgreSQL uses transaction-scoped advisory locks, so this
+# holds across every worker; SQLite (single process) falls back to in-process locks.
+
+_local_locks: "weakref.WeakValueDictionary[Tuple[date, int], asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+class RoomUnavailable(Exception):
+    pass
+
+
+@asynccontextmanager
+async def slot_lock(db: AsyncSession, booking_date: date, room_number: int):
+    if db.bind.dialect.name == "postgresql":
+        # Released automatically when the transaction commits or rolls back
+        await db.execute(select(func.pg_advisory_xact_lock(booking_date.toordinal(), room_number)))
+        yield
+        return
+
+    # Hold a connection before queueing on the lock, so the lock holder never waits on the pool
+    await db.connection()
+    lock = _local_locks.get((booking_date, room_number))
+    if lock is None:
+        lock = _local_locks[(booking_date, room_number)] = asyncio.Lock()
+    async with lock:
+        yield
+
+
+# Takes every advisory lock of a batch in one round trip; the inner ORDER BY fixes the order the
+# outer query acquires them in
+_ADVISORY_LOCKS = text(
+    "SELECT count(*) FROM ("
+    " SELECT pg_advisory_xact_lock(d, r) FROM ("
+    "  SELECT d, r FROM unnest(CAST(:days AS integer[]), CAST(:rooms AS integer[])) AS pairs(d, r)"
+    "  ORDER BY d, r"
+    " ) AS ordered"
+    ") AS locked"
+)
+
+
+# Several slot locks at once, always taken in ascending (date, room) order
+@asynccontextmanager
+async def slot_locks(db: AsyncSession, pairs: Iterable[Tuple[date, int]]):
+    pairs = sorted(set(pairs))
+    if db.bind.dialect.name == "postgresql":
+        await db.execute(_ADVISORY_LOCKS, {
+            "days": [booking_date.toordinal() for booking_date, _ in pairs],
+            "rooms": [room_number for _, room_number in pairs]
+        })
+        yield
+        return
+
+    async with AsyncExitStack() as stack:
+        for booking_date, room_number in pairs:
+            await stack.enter_async_context(slot_lock(db, booking_date, room_number))
+        yield
+
+
+# Picks a room (the requested one, or the first free one), re-checks it under the slot lock,
+# lets `write(room)` add/update the booking and commits. The occupancy index is patched (old ->
+# new slot) before the lock is released, so writers queued on the same room see it taken and
+# move straight on to the next one. Candidates only ever go up, so this ends once every room
+# was tried. Returns the room number; raises RoomUnavailable (after rolling back) when nothing fits.
+async def reserve_room(
+    db: AsyncSession,
+    booking_date: date,
+    start: time,
+    end: time,
+    write: Callable[[int], Booking],
+    exclude_booking_id: Optional[int] = None,
+    room_number: Optional[int] = None,
+    old: Optional[Slot] = None
+) -> int:
+    last_candidate = 0
+    confirmed = False
+    while True:
+        if room_number is not None:
+            candidate = room_number
+        else:
+            rooms = await available_rooms(db, booking_date, start, end, exclude_booking_id)
+            # Rooms are only ever locked in ascending order, so two writers can't deadlock
+            rooms = [r for r in rooms if r > last_candidate]
+            if not rooms:
+                if confirmed:
+                    break
+                # The index may hold a booking another worker has since deleted: "full" is only
+                # believed once the database agrees
+                confirmed = True
+                inventory = await room_inventory.load(db)
+                taken = await booked_rooms_in_db(db, booking_date, start, end, exclude_booking_id)
+                if not [r for r in inventory.available(taken) if r > last_candidate]:
+                    break
+                occupancy_index.invalidate(booking_date)
+                continue
+            candidate = rooms[0]
+
+        async with slot_lock(db, booking_date, candidate):
+            if await is_room_available(db, candidate, booking_date, start, end, exclude_booking_id):
+                booking = write(candidate)
+                try:
+                    await db.commit()
+                except IntegrityError as exc:
+                    # Exclusion constraint (migrations.py) caught an overlap written outside the app
+                    await db.rollback()
+                    if "bookings_no_overlap" not in str(exc.orig):
+                        raise
+                    raise RoomUnavailable()
+                await occupancy_index.booking_changed(old, Slot.of(booking))
+                return candidate
+
+        if room_number is not None:
+            break
+        last_candidate = candidate
+        # Taken by a writer this worker's index hasn't heard of (another worker): reload the day
+        if not (await occupancy_index.day(db, booking_date)).is_booked(candidate, start, end, exclude_booking_id):
+            occupancy_index.invalidate(booking_date)
+
+    await db.rollback()
+    raise RoomUnavailable()
+
+
+# ------------------- Bulk reservations -------------------
+BULK_BOOKING_MAX_ITEMS = int(os.getenv("BULK_BOOKING_MAX_ITEMS", "500"))
+
+
+# One entry of a bulk request. Entries that failed validation come in with status "invalid";
+# reserve_many() moves the "pending" ones to "booked", "unavailable" or "skipped".
+@dataclass
+class BulkItem:
+    index: int
+    name: str
+    date: Optional[date] = None
+    start: Optional[time] = None
+    end: Optional[time] = None
+    room_number: Optional[int] = None  # requested room; None takes the first free one
+    status: str = "pending"
+    error: Optional[str] = None
+    booking_id: Optional[int] = None
+
+
+# Snapshot of every booking and series occurrence on `dates`
+async def _batch_days(db: AsyncSession, dates: List[date]) -> Dict[date, DayOccupancy]:
+    result = await db.execute(
+        select(Booking.id, Booking.date, Booking.room_number, Booking.start_time, Booking.end_time)
+        .where(Booking.date.in_(dates))
+    )
+    rows: Dict[date, list] = defaultdict(list)
+    for booking_id, booking_date, number, start, end in result:
+        rows[booking_date].append((booking_id, number, start, end))
+    # Occurrences on dates outside the batch are ignored below
+    for occurrence in await series_occurrences(db, dates[0], dates[-1]):
+        rows[occurrence.date].append((occurrence.id, occurrence.room_number, occurrence.start_time, occurrence.end_time))
+    return {booking_date: DayOccupancy(rows[booking_date]) for booking_date in dates}
+
+
+# item index -> (room, None) if the item fits, else (None, error). Items naming a room are
+# placed first, so an "any room" item earlier in the batch can't take a room a later one asked for.
+def _place(
+    items: List[BulkItem], days: Dict[date, DayOccupancy], inventory: RoomInventory
+) -> Dict[int, Tuple[Optional[int], Optional[str]]]:
+    placed = {}
+    for item in sorted(items, key=lambda item: item.room_number is None):
+        day = days[item.date]
+        room_number = item.room_number
+        if room_number is not None:
+            if day.is_booked(room_number, item.start, item.end):
+                placed[item.index] = None, f"Room {room_number} is already booked for this time"
+                continue
+        else:
+            free = inventory.available(day.booked_rooms(item.start, item.end))
+            if not free:
+                placed[item.index] = None, "No rooms available for the selected time."
+                continue
+            room_number = free[0]
+        placed[item.index] = room_number, None
+        # Later items in the batch must not land on this one (negative ids never clash with real rows)
+        day.add(-1 - item.index, room_number, item.start, item.end)
+    return placed
+
+
+# A batch whose placement keeps changing under concurrent writers gives up with RoomUnavailable
+BULK_PLACEMENT_ATTEMPTS = 3
+
+
+# Places every pending item against a snapshot of the affected days, then locks only the
+# (date, room) pairs it chose and places the batch again under those locks. If the result is
+# unchanged nobody can take those rooms before the commit; otherwise the locks are released and
+# the new placement is tried. Items are inserted in one statement; in atomic mode nothing is
+# written unless every pending item fits.
+async def reserve_many(db: AsyncSession, user_id: int, items: List[BulkItem], atomic: bool) -> List[BulkItem]:
+    pending = [item for item in items if item.status == "pending"]
+    if not pending:
+        return items
+
+    inventory = await room_inventory.load(db)
+    dates = sorted({item.date for item in pending})
+    placed = _place(pending, await _batch_days(db, dates), inventory)
+
+    for _ in range(BULK_PLACEMENT_ATTEMPTS):
+        pairs = [(item.date, placed[item.index][0]) for item in pending if placed[item.index][0] is not None]
+        # Same ascending (date, room) order as reserve_room, so bulk and single writers can't deadlock
+        async with slot_locks(db, pairs):
+            confirmed = _place(pending, await _batch_days(db, dates), inventory)
+            if confirmed == placed:
+                return await _insert_batch(db, user_id, items, pending, placed, dates, atomic)
+        await db.rollback()
+        placed = confirmed
+    raise RoomUnavailable()
+
+
+async def _insert_batch(
+    db: AsyncSession,
+    user_id: int,
+    items: List[BulkItem],
+    pending: List[BulkItem],
+    placed: Dict[int, Tuple[Optional[int], Optional[str]]],
+    dates: List[date],
+    atomic: bool
+) -> List[BulkItem]:
+    for item in pending:
+        room_number, error = placed[item.index]
+        if room_number is None:
+            item.status, item.error = "unavailable", error
+        else:
+            item.status, item.room_number = "booked", room_number
+
+    booked = [item for item in pending if item.status == "booked"]
+    if not booked or (atomic and len(booked) < len(pending)):
+        for item in booked:
+            item.status = "skipped"
+            item.error = "Not booked: another booking in the batch failed."
+        await db.rollback()
+        return items
+
+    try:
+        result = await db.execute(
+            insert(Booking).returning(Booking.id, sort_by_parameter_order=True),
+            [
+                {
+                    "name": item.name,
+                    "user_id": user_id,
+                    "room_number": item.room_number,
+                    "date": item.date,
+                    "start_time": item.start,
+                    "end_time": item.end
+                }
+                for item in booked
+            ]
+        )
+        for item, booking_id in zip(booked, result.scalars()):
+            item.booking_id = booking_id
+        await db.commit()
+    except IntegrityError as exc:
+        await db.rollback()
+        if "bookings_no_overlap" not in str(exc.orig):
+            raise
+        for booking_date in dates:
+            occupancy_index.invalidate(booking_date)
+        raise RoomUnavailable()
+
+    await occupancy_index.bookings_changed(
+        (None, Slot(item.booking_id, item.room_number, item.date, item.start, item.end)) for item in booked
+    )
+    return items
+
+
+# ------------------- Recurring series -------------------
+# Books every occurrence of `series` at once: takes the slot lock of each date it covers, then
+# checks all of them with one query against bookings and one against other series.
+# Returns the clashing dates; nothing is written unless that list is empty.
+async def reserve_series(db: AsyncSession, series: BookingSeries, dates: List[date]) -> List[date]:
+    room_number, start, end = series.room_number, series.start_time, series.end_time
+    wanted = set(dates)
+
+    async with slot_locks(db, ((d, room_number) for d in dates)):
+        result = await db.execute(
+            select(Booking.date).where(
+                Booking.room_number == room_number,
+                Booking.date.between(dates[0], dates[-1]),
+                Booking.start_time < end,
+                Booking.end_time > start
+            )
+        )
+        clashes = {d for d in result.scalars() if d in wanted}
+        for occurrence in await series_occurrences(
+            db, dates[0], dates[-1],
+            BookingSeries.room_number == room_number, BookingSeries.start_time < end, BookingSeries.end_time > start
+        ):
+            if occurrence.date in wanted:
+                clashes.add(occurrence.date)
+
+        if clashes:
+            await db.rollback()
+            return sorted(clashes)
+
+        db.add(series)
+        await db.commit()
+
+    await occupancy_index.bookings_changed(
+        (None, Slot(-series.id, room_number, d, start, end)) for d in dates
+    )
+    return []
+
+
+# ------------------- Free slot search -------------------
+# Candidate starts are on the grid's 15-minute boundaries; the default daily window for
+# suggestions is office hours
+FREE_SLOT_STEP = GRID_SLOT_MINUTES
+FREE_SLOT_MAX_DAYS = int(os.getenv("FREE_SLOT_MAX_DAYS", "31"))
+FREE_SLOT_DAY_START = time.fromisoformat(os.getenv("FREE_SLOT_DAY_START", "08:00"))
+FREE_SLOT_DAY_END = time.fromisoformat(os.getenv("FREE_SLOT_DAY_END", "20:00"))
+
+
+class FreeSlot(NamedTuple):
+    room_number: int
+    date: date
+    start_time: time
+    end_time: time
+
+
+def _minutes(value: time) -> int:
+    return value.hour * 60 + value.minute
+
+
+def _step_up(minutes: int) -> int:
+    return -(-minutes // FREE_SLOT_STEP) * FREE_SLOT_STEP
+
+
+# Sweep over one room's busy intervals (minutes, sorted by start): the earliest start that
+# fits `duration` in each gap of [earliest, latest)
+def free_starts(busy: List[Tuple[int, int]], duration: int, earliest: int, latest: int) -> Iterator[int]:
+    cursor = _step_up(earliest)
+    for start, end in busy:
+        if cursor + duration <= min(start, latest):
+            yield cursor
+        cursor = max(cursor, _step_up(end))
+        if cursor + duration > latest:
+            return
+    if cursor + duration <= latest:
+        yield cursor
+
+
+# The earliest `limit` (room, start) pairs, ordered by date, start and room, where one of `rooms`
+# is free for `duration` minutes between `earliest` and `latest` on a day in [first, last] and
+# not before `not_before` (default: now, since /book rejects starts in the past).
+# Bookings and series occurrences of the whole range are read with one query each.
+async def find_free_slots(
+    db: AsyncSession,
+    first: date,
+    last: date,
+    duration: int,
+    rooms: List[RoomInfo],
+    earliest: time = FREE_SLOT_DAY_START,
+    latest: time = FREE_SLOT_DAY_END,
+    limit: int = 5,
+    not_before: Optional[datetime] = None
+) -> List[FreeSlot]:
+    numbers = [room.number for room in rooms]
+    if not numbers:
+        return []
+    not_before = max(not_before or datetime.min, datetime.now() + timedelta(minutes=1))
+    first = max(first, not_before.date())
+
+    busy: Dict[Tuple[date, int], List[Tuple[int, int]]] = defaultdict(list)
+    result = await db.execute(
+        select(Booking.date, Booking.room_number, Booking.start_time, Booking.end_time)
+        .where(Booking.date.between(first, last), Booking.room_number.in_(numbers))
+    )
+    for booking_date, room_number, start, end in result:
+        busy[(booking_date, room_number)].append((_minutes(start), _minutes(end)))
+    for occurrence in await series_occurrences(db, first, last, BookingSeries.room_number.in_(numbers)):
+        busy[(occurrence.date, occurrence.room_number)].append(
+            (_minutes(occurrence.start_time), _minutes(occurrence.end_time))
+        )
+
+    found: List[FreeSlot] = []
+    day = first
+    while day <= last and len(found) < limit:
+        window_start = _minutes(earliest)
+        if day == not_before.date():
+            # Strictly after not_before, like /book's "past date/time" check
+            window_start = max(window_start, _minutes(not_before.time()) + 1)
+
+        candidates = []
+        for number in numbers:
+            for start in free_starts(sorted(busy.get((day, number), ())), duration, window_start, _minutes(latest)):
+                candidates.append((start, number))
+
+        # Later days can't beat anything found on this one
+        for start, number in sorted(candidates)[:limit - len(found)]:
+            end = start + duration
+            found.append(FreeSlot(number, day, time(start // 60, start % 60), time(end // 60, end % 60)))
+        day += timedelta(days=1)
+
+    return found
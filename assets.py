@@ -0,0 +1,225 @@
+# Fingerprinted, precompressed static assets.
+#
+# Every file under static/ gets a copy named after its content hash (style.css ->
+# style.3b8f0c2a91.css) plus .br/.gz siblings, listed in manifest.json. Templates link assets
+# through static_url(), so a changed file gets a new URL and the old one can be cached forever:
+# fingerprinted URLs are served with "Cache-Control: immutable" and repeat visits make no static
+# requests at all. Plain /static/<name> URLs keep working, with the usual revalidation.
+#
+#   python assets.py            # build into STATIC_BUILD_DIR, e.g. in the deploy step
+#
+# Without a (current) build the app builds into STATIC_CACHE_DIR at startup, in a directory named
+# after the sources' combined hash: workers and restarts with the same sources share one build.
+import argparse
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+
+from compression import SUFFIXES, compress, negotiate
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = "static"
+STATIC_BUILD_DIR = os.getenv("STATIC_BUILD_DIR", "static_build")
+# Off: static_url() returns plain /static/<name> URLs and nothing is built
+STATIC_FINGERPRINT = os.getenv("STATIC_FINGERPRINT", "True").lower() == "true"
+# Startup builds, one subdirectory per version of static/; like TEMPLATE_CACHE_DIR it survives restarts
+STATIC_CACHE_DIR = os.getenv("STATIC_CACHE_DIR", os.path.join(tempfile.gettempdir(), "room-booking-static"))
+# Builds of other versions are removed once they are this old (workers of a previous deploy may
+# still be serving them for a while)
+STATIC_CACHE_MAX_AGE = 24 * 3600
+MANIFEST_NAME = "manifest.json"
+FINGERPRINT_LENGTH = 10
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+# ------------------- Build -------------------
+def fingerprint(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:FINGERPRINT_LENGTH]
+
+
+def fingerprinted_name(name: str, digest: str) -> str:
+    root, ext = os.path.splitext(name)
+    return f"{root}.{digest}{ext}"
+
+
+def source_files(source: str) -> List[str]:
+    names = []
+    for directory, _, files in os.walk(source):
+        for file in files:
+            names.append(os.path.relpath(os.path.join(directory, file), source).replace(os.sep, "/"))
+    return sorted(names)
+
+
+# Writes the fingerprinted copies, their compressed siblings and the manifest into `output`:
+# {"style.css": {"path": "style.3b8f0c2a91.css", "hash": "3b8f0c2a91", "encodings": ["br", "gzip"]}}
+def build(source: str = STATIC_DIR, output: str = STATIC_BUILD_DIR) -> Dict[str, dict]:
+    os.makedirs(output, exist_ok=True)
+    manifest = {}
+    for name in source_files(source):
+        with open(os.path.join(source, name), "rb") as f:
+            data = f.read()
+        digest = fingerprint(data)
+        path = fingerprinted_name(name, digest)
+        target = os.path.join(output, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as f:
+            f.write(data)
+
+        variants = compress(data)
+        for encoding, body in variants.items():
+            with open(target + SUFFIXES[encoding], "wb") as f:
+                f.write(body)
+        manifest[name] = {"path": path, "hash": digest, "encodings": list(variants)}
+
+    with open(os.path.join(output, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+# ------------------- Startup build -------------------
+def source_hashes(source: str) -> Dict[str, str]:
+    hashes = {}
+    for name in source_files(source):
+        with open(os.path.join(source, name), "rb") as f:
+            hashes[name] = fingerprint(f.read())
+    return hashes
+
+
+# Build directory and manifest for these sources, building them unless an earlier start did.
+# Each build goes to a scratch directory that is renamed into place, so concurrent workers never
+# see a half-written build and the loser of a race just discards its copy.
+def cached_build(hashes: Dict[str, str]) -> Tuple[str, Dict[str, dict]]:
+    os.makedirs(STATIC_CACHE_DIR, exist_ok=True)
+    version = fingerprint(json.dumps(hashes, sort_keys=True).encode())
+    build_dir = os.path.join(STATIC_CACHE_DIR, version)
+    manifest = AssetManifest._read(build_dir)
+    if manifest is not None:
+        return build_dir, manifest
+
+    scratch = tempfile.mkdtemp(prefix=f".{version}-", dir=STATIC_CACHE_DIR)
+    try:
+        build(STATIC_DIR, scratch)
+        os.rename(scratch, build_dir)
+    except OSError:
+        if AssetManifest._read(build_dir) is None:
+            raise
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    prune_cache(keep=version)
+    return build_dir, AssetManifest._read(build_dir)
+
+
+def prune_cache(keep: str) -> None:
+    cutoff = time.time() - STATIC_CACHE_MAX_AGE
+    for entry in os.scandir(STATIC_CACHE_DIR):
+        if entry.name != keep and entry.stat().st_mtime < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+# ------------------- Runtime -------------------
+@dataclass
+class Asset:
+    media_type: str
+    # Content-Encoding -> (file, stat), best first; None is the uncompressed file
+    files: Dict[Optional[str], tuple]
+
+
+class AssetManifest:
+    def __init__(self):
+        self.build_dir: Optional[str] = None
+        self.urls: Dict[str, str] = {}  # source name -> fingerprinted name
+        self.assets: Dict[str, Asset] = {}  # fingerprinted name -> asset
+
+    # Uses the build in STATIC_BUILD_DIR when it matches the current sources, and otherwise
+    # the startup build in STATIC_CACHE_DIR
+    def load(self) -> None:
+        if not STATIC_FINGERPRINT:
+            return
+        hashes = source_hashes(STATIC_DIR)
+        manifest = self._read(STATIC_BUILD_DIR)
+        build_dir = STATIC_BUILD_DIR
+        if manifest is None or {name: entry["hash"] for name, entry in manifest.items()} != hashes:
+            if manifest is not None:
+                logger.warning("%s is stale; building static assets at startup", STATIC_BUILD_DIR)
+            build_dir, manifest = cached_build(hashes)
+
+        self.build_dir = build_dir
+        self.urls = {name: entry["path"] for name, entry in manifest.items()}
+        self.assets = {}
+        for name, entry in manifest.items():
+            file = os.path.join(build_dir, entry["path"])
+            files = {encoding: file + SUFFIXES[encoding] for encoding in entry["encodings"]}
+            files[None] = file
+            self.assets[entry["path"]] = Asset(
+                media_type=mimetypes.guess_type(name)[0] or "application/octet-stream",
+                files={encoding: (path, os.stat(path)) for encoding, path in files.items()}
+            )
+
+    @staticmethod
+    def _read(build_dir: str) -> Optional[Dict[str, dict]]:
+        try:
+            with open(os.path.join(build_dir, MANIFEST_NAME)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def url(self, name: str) -> str:
+        return f"/static/{self.urls.get(name, name)}"
+
+
+asset_manifest = AssetManifest()
+
+
+# Template helper: {{ static_url('style.css') }} -> /static/style.3b8f0c2a91.css
+def static_url(name: str) -> str:
+    return asset_manifest.url(name)
+
+
+# /static mount: fingerprinted names come from the build, precompressed and immutable; any
+# other path is served from static/ as before
+class AssetFiles(StaticFiles):
+    async def get_response(self, path: str, scope) -> Response:
+        asset = asset_manifest.assets.get(path)
+        if asset is None:
+            return await super().get_response(path, scope)
+
+        request_headers = Headers(scope=scope)
+        encoding = negotiate(request_headers.get("accept-encoding"), [e for e in asset.files if e is not None])
+        file, stat = asset.files[encoding]
+        headers = {"Cache-Control": IMMUTABLE, "Vary": "Accept-Encoding"}
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        response = FileResponse(file, stat_result=stat, media_type=asset.media_type, headers=headers)
+        if self.is_not_modified(response.headers, request_headers):
+            return Response(status_code=304, headers={"ETag": response.headers["etag"], **headers})
+        return response
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build fingerprinted, precompressed static assets")
+    parser.add_argument("--source", default=STATIC_DIR)
+    parser.add_argument("--output", default=STATIC_BUILD_DIR)
+    parser.add_argument("--clean", action="store_true", help="empty the output directory first")
+    args = parser.parse_args()
+    if args.clean:
+        shutil.rmtree(args.output, ignore_errors=True)
+    manifest = build(args.source, args.output)
+    for name, entry in manifest.items():
+        print(f"{name} -> {entry['path']} ({', '.join(entry['encodings']) or 'uncompressed'})")
+
+
+if __name__ == "__main__":
+    main()
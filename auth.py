@@ -1,3 +1,6 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, Any, Tuple
 
@@ -5,11 +8,15 @@ import os
 from dotenv import load_dotenv
 from passlib.context import CryptContext
 from jose import JWTError, jwt, ExpiredSignatureError
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends, HTTPException, Request, status
 
 from models import User
 from database import get_db
+from cache import TTLCache
+from notifications import hub
+from metrics import PASSWORD_HASH_QUEUED, PASSWORD_HASH_REJECTED, PASSWORD_HASH_RUNNING
 
 
 
@@ -25,6 +32,80 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+# Dedicated bcrypt pool: a login burst queues here instead of starving Starlette's shared
+# thread pool. bcrypt releases the GIL, so the worker threads hash in parallel.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "2"))
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0  # running + queued; only touched from the event loop
+        self.completed = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+
+    async def run(self, func, *args):
+        # Back-pressure: shed load instead of letting the queue (and latency) grow without bound
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            PASSWORD_HASH_REJECTED.inc()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please try again shortly",
+                headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER)}
+            )
+
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        self._update_gauges()
+        # Counted as pending until the job itself is done (or cancelled while still queued), not
+        # until this caller stops waiting: a disconnected client's hash keeps its worker busy
+        job = self._executor.submit(func, *args)
+        job.add_done_callback(lambda _: self._call_in_loop(loop, self._job_done))
+        return await asyncio.wrap_future(job)
+
+    @staticmethod
+    def _call_in_loop(loop: asyncio.AbstractEventLoop, callback) -> None:
+        try:
+            loop.call_soon_threadsafe(callback)
+        except RuntimeError:
+            pass  # loop already closed at shutdown
+
+    def _job_done(self) -> None:
+        self.pending -= 1
+        self.completed += 1
+        self._update_gauges()
+
+    def _update_gauges(self) -> None:
+        PASSWORD_HASH_RUNNING.set(min(self.pending, self.workers))
+        PASSWORD_HASH_QUEUED.set(max(self.pending - self.workers, 0))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "running": min(self.pending, self.workers),
+            "queued": max(self.pending - self.workers, 0),
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
+
+async def hash_password_async(password: str) -> str:
+    return await password_hasher.run(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
 # JWT Config
 SECRET_KEY = os.getenv("SECRET_KEY", "your_default_dev_secret_key")
 ALGORITHM = "HS256"
@@ -48,7 +129,31 @@ def decode_access_token(token: str) -> Tuple[Optional[Dict[str, Any]], Optional[
         return None, "invalid"
 
 
-def get_current_user(request: Request, db: Session = Depends(get_db)):
+# Resolved identities keyed by token subject, so authenticated requests skip the user lookup
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    id: int
+    username: str
+    email: str
+
+
+def _drop_cached_user(message: Dict[str, Any]) -> None:
+    user_cache.pop(message["username"])
+
+hub.subscribe("user_cache", _drop_cached_user)
+
+
+# Call after any change to a user row; other workers drop it too when NOTIFY_BACKEND=postgres
+async def invalidate_user(username: str) -> None:
+    await hub.publish("user_cache", {"username": username})
+
+
+async def get_current_user(request: Request, db: AsyncSession = Depends(get_db)):
     token = request.cookies.get("access_token")
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
@@ -59,9 +164,15 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
         if username is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
-        user = db.query(User).filter(User.username == username).first()
-        if not user:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+        user = user_cache.get(username)
+        if user is None:
+            result = await db.execute(select(User).where(User.username == username))
+            db_user = result.scalars().first()
+            if not db_user:
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+
+            user = CurrentUser(id=db_user.id, username=db_user.username, email=db_user.email)
+            user_cache.set(username, user)
 
         return user
     except JWTError:
@@ -0,0 +1,54 @@
+# Compares two bench/run_benchmarks.py result files, endpoint by endpoint.
+#
+#   python bench/compare.py bench/results/before.json bench/results/after.json
+#
+# Exits non-zero if any endpoint's p95 got more than --threshold percent slower.
+import argparse
+import json
+import sys
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "queries_per_request")
+
+
+def change(before, after) -> str:
+    if before is None or after is None:
+        return ""
+    if not before:
+        return "   n/a"
+    return f"{(after - before) / before * 100:+6.1f}%"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed p95 slowdown in percent")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(f"before: {before['meta']['commit']} ({before['meta']['bookings']:,} bookings, {before['meta']['database']})")
+    print(f"after:  {after['meta']['commit']} ({after['meta']['bookings']:,} bookings, {after['meta']['database']})")
+
+    regressed = []
+    for name, new in after["endpoints"].items():
+        old = before["endpoints"].get(name)
+        if old is None:
+            print(f"\n{name}: only in {args.after}")
+            continue
+        print(f"\n{name}")
+        for metric in METRICS:
+            print(f"  {metric:20} {old.get(metric)!s:>10} -> {new.get(metric)!s:>10} {change(old.get(metric), new.get(metric))}")
+        if old["p95_ms"] and (new["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 > args.threshold:
+            regressed.append(name)
+
+    if regressed:
+        print(f"\np95 regressed by more than {args.threshold}%: {', '.join(regressed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+# Latency/throughput benchmark for the main endpoints, against a database seeded by seed.py.
+#
+# Each endpoint runs as its own phase: --warmup untimed requests, then --requests timed ones
+# with --concurrency in flight. Reported per endpoint: p50/p95/p99/mean latency, throughput,
+# errors (HTTP >= 400) and SQL statements per request (from the Server-Timing header).
+# Results go to a JSON file (default bench/results/<time>-<commit>.json); compare two runs
+# with bench/compare.py.
+#
+#   DATABASE_URL=sqlite:///./bench.db python bench/seed.py --bookings 100000
+#   DATABASE_URL=sqlite:///./bench.db python bench/run_benchmarks.py
+#   DATABASE_URL=postgresql://... python bench/run_benchmarks.py --url http://127.0.0.1:8000 --concurrency 50
+#
+# Without --url the app runs in process through httpx's ASGI transport. With --url it hits a
+# running server; DATABASE_URL must point at the same database (to pick bookings to update).
+#
+# /book and /update-booking write to days from BENCH_FIRST_FREE_DAY on. When the run ends, those
+# writes are undone (moved bookings go back, new ones are deleted), so every run starts from
+# the seeded data; a database with bookings on those days is refused.
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import httpx
+from sqlalchemy import bindparam, delete, func, select, update
+
+from seed import BENCH_PASSWORD, username
+
+ENDPOINTS = ("login", "book", "history", "available_rooms", "update_booking")
+# Days ahead of today used only by the benchmark's writes
+BENCH_FIRST_FREE_DAY = 3650
+# Statement count the app reports in Server-Timing (querystats.QueryStatsMiddleware)
+QUERY_COUNT = re.compile(r'db;desc="(\d+) queries"')
+
+
+class Scenario:
+    def __init__(self, client: httpx.AsyncClient, users: int, booking_ids, day_range, rng: random.Random):
+        self.client = client
+        self.users = users
+        self.booking_ids = booking_ids
+        self.first_day, self.last_day = day_range
+        self.rng = rng
+        # /book and /update-booking write to dates nobody else uses, so every request succeeds
+        self.free_day = free_day()
+
+    def random_day(self) -> date:
+        return self.first_day + timedelta(days=self.rng.randint(0, (self.last_day - self.first_day).days))
+
+    async def login(self, i: int) -> httpx.Response:
+        return await self.client.post(
+            "/login", data={"username": username(i % self.users), "password": BENCH_PASSWORD}, cookies={}
+        )
+
+    async def book(self, i: int) -> httpx.Response:
+        day = self.free_day + timedelta(days=i // 10)  # ten rooms per day
+        return await self.client.post("/book", data={
+            "name": "bench", "date_str": day.isoformat(), "start_time": "10:00", "end_time": "11:00"
+        })
+
+    async def history(self, i: int) -> httpx.Response:
+        return await self.client.get("/history")
+
+    async def available_rooms(self, i: int) -> httpx.Response:
+        hour = self.rng.randint(7, 19)
+        return await self.client.post("/available-rooms/0", json={
+            "new_date": self.random_day().isoformat(), "new_start": f"{hour:02d}:00", "new_end": f"{hour + 1:02d}:00"
+        })
+
+    async def update_booking(self, i: int) -> httpx.Response:
+        booking_id = self.booking_ids[i % len(self.booking_ids)]
+        day = self.free_day + timedelta(days=1000 + i // 10)
+        return await self.client.put(f"/update-booking/{booking_id}", json={
+            "new_date": day.isoformat(), "new_start": "14:00", "new_end": "15:00", "room": i % 10 + 1
+        })
+
+
+def free_day() -> date:
+    return date.today() + timedelta(days=BENCH_FIRST_FREE_DAY)
+
+
+# Puts the bookings /update-booking moved back where they were and deletes the ones /book made
+def restore(engine, originals) -> None:
+    from models import Booking
+
+    with engine.begin() as conn:
+        if originals:
+            conn.execute(
+                update(Booking).where(Booking.id == bindparam("b_id")).values(
+                    room_number=bindparam("b_room"), date=bindparam("b_date"),
+                    start_time=bindparam("b_start"), end_time=bindparam("b_end")
+                ),
+                [
+                    {"b_id": row.id, "b_room": row.room_number, "b_date": row.date,
+                     "b_start": row.start_time, "b_end": row.end_time}
+                    for row in originals
+                ]
+            )
+        conn.execute(delete(Booking).where(Booking.date >= free_day()))
+
+
+def percentile(sorted_values, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+async def run_phase(request, requests: int, concurrency: int, offset: int = 0):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+    queries = 0
+
+    async def one(i: int) -> None:
+        nonlocal errors, queries
+        async with semaphore:
+            started = time.perf_counter()
+            response = await request(offset + i)
+            latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            errors += 1
+        match = QUERY_COUNT.search(response.headers.get("server-timing", ""))
+        if match:
+            queries += int(match.group(1))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies, errors, queries, time.perf_counter() - started
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args) -> dict:
+    from database import engine
+    from models import Booking, User
+
+    with engine.connect() as conn:
+        bench_user = conn.execute(select(User.id).where(User.username == username(0))).scalar()
+        if bench_user is None:
+            raise SystemExit("No benchmark users; run bench/seed.py first")
+        users = conn.execute(select(func.count()).select_from(User).where(User.username.like("bench%"))).scalar()
+        total_bookings = conn.execute(select(func.count()).select_from(Booking)).scalar()
+        first_day, last_day = conn.execute(select(func.min(Booking.date), func.max(Booking.date))).one()
+        booking_ids = list(conn.execute(
+            select(Booking.id).where(Booking.user_id == bench_user).order_by(Booking.id).limit(args.requests + args.warmup)
+        ).scalars())
+        leftovers = conn.execute(select(func.count()).select_from(Booking).where(Booking.date >= free_day())).scalar()
+        originals = conn.execute(
+            select(Booking.id, Booking.room_number, Booking.date, Booking.start_time, Booking.end_time)
+            .where(Booking.id.in_(booking_ids))
+        ).all()
+    if not booking_ids:
+        raise SystemExit(f"{username(0)} has no bookings; seed more bookings")
+    if leftovers:
+        raise SystemExit(
+            f"{leftovers} bookings on or after {free_day()} (left by an interrupted run?); "
+            "run bench/seed.py --reset first"
+        )
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=120)
+        lifespan = None
+    else:
+        from main import app
+
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120)
+        lifespan = app.router.lifespan_context(app)
+        await lifespan.__aenter__()
+
+    results = {}
+    try:
+        async with client:
+            response = await client.post("/login", data={"username": username(0), "password": BENCH_PASSWORD})
+            if "access_token" not in response.cookies:
+                raise SystemExit(f"Login failed: {response.status_code}")
+            client.cookies.set("access_token", response.cookies["access_token"])
+
+            scenario = Scenario(client, users, booking_ids, (first_day, last_day), random.Random(args.seed))
+            for name in args.endpoints:
+                request = getattr(scenario, name)
+                await run_phase(request, args.warmup, args.concurrency)
+                latencies, errors, queries, elapsed = await run_phase(request, args.requests, args.concurrency, args.warmup)
+                latencies.sort()
+                results[name] = {
+                    "requests": args.requests,
+                    "errors": errors,
+                    "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                    "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+                    "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+                    "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+                    "throughput_rps": round(args.requests / elapsed, 1),
+                    "queries_per_request": round(queries / args.requests, 2)
+                }
+                print(f"{name:16} p50={results[name]['p50_ms']:8.2f}ms p95={results[name]['p95_ms']:8.2f}ms "
+                      f"p99={results[name]['p99_ms']:8.2f}ms {results[name]['throughput_rps']:8.1f} req/s "
+                      f"queries/req={results[name]['queries_per_request']} errors={errors}")
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+        restore(engine, originals)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "database": engine.dialect.name,
+            "bookings": total_bookings,
+            "users": users,
+            "target": args.url or "in-process",
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "python": platform.python_version()
+        },
+        "endpoints": results
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the booking endpoints")
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=20, help="untimed requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--url", help="base URL of a running server instead of the in-process app")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="JSON file to write (default bench/results/<time>-<commit>.json)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    output = args.output or os.path.join(
+        "bench", "results", f"{datetime.now():%Y%m%d-%H%M%S}-{report['meta']['commit']}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {output}")
+
+
+if __name__ == "__main__":
+    main()
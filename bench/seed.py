@@ -0,0 +1,133 @@
+# Seeds the database in DATABASE_URL with benchmark users and bookings.
+#
+# Bookings never overlap: every (date, room, 15-minute slot) cell of a run of consecutive days is
+# filled with probability --density, with random lengths of one to four slots, until --bookings
+# rows exist. Half of the days lie in the past and half in the future, so /history has both.
+# The same --seed always produces the same rows.
+#
+#   DATABASE_URL=sqlite:///./bench.db python bench/seed.py --users 100 --bookings 10000
+#   DATABASE_URL=postgresql://... python bench/seed.py --users 10000 --bookings 10000000 --reset
+#
+# Every user is bench<N> with password BENCH_PASSWORD.
+import argparse
+import os
+import random
+import sys
+import time as timer
+from datetime import date, time, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from sqlalchemy import delete, func, insert, select
+
+BENCH_PASSWORD = "bench-password"
+SLOT_MINUTES = 15
+FIRST_SLOT, LAST_SLOT = 7 * 4, 21 * 4  # bookings between 07:00 and 21:00
+
+
+def username(i: int) -> str:
+    return f"bench{i}"
+
+
+def slot_time(slot: int) -> time:
+    minutes = slot * SLOT_MINUTES
+    return time(minutes // 60, minutes % 60)
+
+
+# Yields (date, room, start, end) until `count` bookings were produced
+def generate_bookings(count: int, rooms, density: float, rng: random.Random):
+    per_day = len(rooms) * (LAST_SLOT - FIRST_SLOT) * density / 2.5  # 2.5 slots per booking on average
+    days = max(1, int(count / per_day) + 1)
+    day = date.today() - timedelta(days=days // 2)
+    produced = 0
+    while True:
+        for room in rooms:
+            slot = FIRST_SLOT
+            while slot < LAST_SLOT:
+                if rng.random() >= density:
+                    slot += 1
+                    continue
+                length = min(rng.randint(1, 4), LAST_SLOT - slot)
+                yield day, room, slot_time(slot), slot_time(slot + length)
+                produced += 1
+                if produced >= count:
+                    return
+                slot += length
+        day += timedelta(days=1)
+
+
+def seed(users: int, bookings: int, density: float, batch: int, reset: bool, rng: random.Random) -> None:
+    from auth import hash_password
+    from database import Base, engine
+    from migrations import run_migrations, schema_lock
+    from models import Booking, BookingSeries, Room, User
+
+    with schema_lock(engine):
+        Base.metadata.create_all(bind=engine)
+        run_migrations(engine)
+
+    with engine.begin() as conn:
+        if reset:
+            conn.execute(delete(BookingSeries))
+            conn.execute(delete(Booking))
+            conn.execute(delete(User).where(User.username.like("bench%")))
+
+        rooms = list(conn.execute(select(Room.number).where(Room.is_active.is_(True)).order_by(Room.number)).scalars())
+        existing = set(conn.execute(select(User.username).where(User.username.like("bench%"))).scalars())
+        # One bcrypt hash shared by every user; hashing thousands of passwords would dominate the run
+        password = hash_password(BENCH_PASSWORD)
+        new_users = [
+            {"username": username(i), "email": f"{username(i)}@bench.example.com", "password": password}
+            for i in range(users) if username(i) not in existing
+        ]
+        if new_users:
+            conn.execute(insert(User), new_users)
+        user_ids = list(conn.execute(
+            select(User.id).where(User.username.like("bench%")).order_by(User.id)
+        ).scalars())[:users]
+
+    started = timer.perf_counter()
+    rows = []
+    written = 0
+    for booking_date, room, start, end in generate_bookings(bookings, rooms, density, rng):
+        rows.append({
+            "user_id": rng.choice(user_ids),
+            "name": "bench",
+            "room_number": room,
+            "date": booking_date,
+            "start_time": start,
+            "end_time": end
+        })
+        if len(rows) >= batch:
+            with engine.begin() as conn:
+                conn.execute(insert(Booking), rows)
+            written += len(rows)
+            rows = []
+            print(f"\r{written:,} bookings", end="", flush=True)
+    if rows:
+        with engine.begin() as conn:
+            conn.execute(insert(Booking), rows)
+        written += len(rows)
+
+    with engine.connect() as conn:
+        total = conn.execute(select(func.count()).select_from(Booking)).scalar()
+    print(f"\r{written:,} bookings written in {timer.perf_counter() - started:.1f}s "
+          f"({len(user_ids)} users, {total:,} bookings in the table)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Seed benchmark users and bookings")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--bookings", type=int, default=10_000)
+    parser.add_argument("--density", type=float, default=0.5, help="share of free slots that start a booking")
+    parser.add_argument("--batch", type=int, default=10_000, help="rows per INSERT")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="delete all bookings and bench users first")
+    args = parser.parse_args()
+    seed(args.users, args.bookings, args.density, args.batch, args.reset, random.Random(args.seed))
+
+
+if __name__ == "__main__":
+    main()
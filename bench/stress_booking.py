@@ -0,0 +1,155 @@
+# Concurrency stress test for POST /book.
+#
+# Fires hundreds of parallel booking requests at a few overlapping time slots on one date
+# and then checks the bookings table for overlapping rows in the same room, and that no request
+# was turned away while a room was still free for its slot. A second date gets exactly one
+# identical request per room, all of which must be booked.
+# Exits non-zero if any room was double booked or a request was refused with a room to spare.
+# Bookings this script made on its dates before are deleted first.
+#
+#   DATABASE_URL=sqlite:///./stress.db python bench/stress_booking.py --requests 300 --concurrency 100
+#   DATABASE_URL=postgresql://... python bench/stress_booking.py --url http://127.0.0.1:8000
+#
+# Without --url the app runs in process through httpx's ASGI transport. With --url it hits a
+# running server (e.g. several uvicorn workers); DATABASE_URL must point at the same database.
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import date, timedelta
+from datetime import time as dt_time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import httpx
+from sqlalchemy import delete, select, text
+
+SLOTS = [("09:00", "10:00"), ("09:30", "10:30"), ("10:00", "11:00"), ("09:45", "10:15")]
+
+OVERLAPS_SQL = text("""
+    SELECT a.id, b.id, a.room_number
+    FROM bookings a
+    JOIN bookings b
+      ON a.id < b.id
+     AND a.date = b.date
+     AND a.room_number = b.room_number
+     AND a.start_time < b.end_time
+     AND a.end_time > b.start_time
+    WHERE a.date = :day
+""")
+
+
+async def login(client: httpx.AsyncClient) -> None:
+    username = f"stress{os.getpid()}"
+    password = "stress-password"
+    await client.post("/register", data={"username": username, "email": f"{username}@gmail.com", "password": password})
+    response = await client.post("/login", data={"username": username, "password": password})
+    if "access_token" not in response.cookies:
+        raise SystemExit(f"Login failed: {response.status_code}")
+    client.cookies.set("access_token", response.cookies["access_token"])
+
+
+async def fire(client: httpx.AsyncClient, day: date, requests: int, concurrency: int, slots=SLOTS) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    outcomes = {"booked": 0, "full": 0, "error": 0, "refused": set()}
+
+    async def one(i: int) -> None:
+        start, end = slots[i % len(slots)]
+        async with semaphore:
+            response = await client.post("/book", data={
+                "name": f"stress {i}", "date_str": day.isoformat(), "start_time": start, "end_time": end
+            })
+        if response.status_code != 200:
+            outcomes["error"] += 1
+        elif "successfully booked" in response.text:
+            outcomes["booked"] += 1
+        else:
+            outcomes["full"] += 1
+            outcomes["refused"].add((start, end))
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return outcomes
+
+
+# Refused slots for which some room is still free at the end. Bookings only accumulate during
+# the run, so such a room was also free when the request was refused.
+def wrongly_refused(conn, day: date, refused, rooms) -> list:
+    booked = conn.execute(
+        text("SELECT room_number, start_time, end_time FROM bookings WHERE date = :day"), {"day": day}
+    ).all()
+    wrong = []
+    for start, end in sorted(refused):
+        start_t, end_t = time_of(start), time_of(end)
+        taken = {room for room, s, e in booked if time_of(s) < end_t and time_of(e) > start_t}
+        free = [room for room in rooms if room not in taken]
+        if free:
+            wrong.append((start, end, free))
+    return wrong
+
+
+def time_of(value):
+    # SQLite hands times back as strings
+    return value if not isinstance(value, str) else dt_time.fromisoformat(value)
+
+
+async def run(args) -> int:
+    from database import engine
+    from models import Booking, Room
+
+    day = date.today() + timedelta(days=args.days_ahead)
+    identical_day = day + timedelta(days=1)
+    with engine.begin() as conn:
+        rooms = list(conn.execute(select(Room.number).where(Room.is_active.is_(True))).scalars())
+        conn.execute(delete(Booking).where(Booking.date.in_([day, identical_day]), Booking.name.like("stress %")))
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+        lifespan = None
+    else:
+        from main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://stress", timeout=60)
+        lifespan = app.router.lifespan_context(app)
+        await lifespan.__aenter__()
+
+    try:
+        async with client:
+            await login(client)
+            started = time.perf_counter()
+            outcomes = await fire(client, day, args.requests, args.concurrency)
+            elapsed = time.perf_counter() - started
+            identical = await fire(client, identical_day, len(rooms), len(rooms), slots=SLOTS[:1])
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+
+    with engine.connect() as conn:
+        overlaps = conn.execute(OVERLAPS_SQL, {"day": day}).all()
+        wrong = wrongly_refused(conn, day, outcomes["refused"], rooms)
+
+    print(f"date={day} requests={args.requests} concurrency={args.concurrency} elapsed={elapsed:.2f}s")
+    print(f"booked={outcomes['booked']} no_room={outcomes['full']} errors={outcomes['error']} overlaps={len(overlaps)}")
+    for a_id, b_id, room in overlaps[:20]:
+        print(f"  room {room}: bookings {a_id} and {b_id} overlap")
+    for start, end, free in wrong:
+        print(f"  {start}-{end} was refused while rooms {free} were free")
+    print(f"identical: {len(rooms)} requests for {len(rooms)} rooms, booked={identical['booked']} "
+          f"no_room={identical['full']} errors={identical['error']}")
+
+    failed = overlaps or wrong or outcomes["error"] or identical["booked"] != len(rooms)
+    return 1 if failed else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Concurrent POST /book stress test")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--days-ahead", type=int, default=30, help="book this many days from today")
+    parser.add_argument("--url", help="base URL of a running server instead of the in-process app")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import gzip
+from typing import Dict, Iterable, Optional
+
+# Brotli is optional (pip install brotli): without it only gzip variants are produced
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+# Content-Encoding -> file suffix of precompressed siblings
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+# Every encoding available here, best first, mapped to the compressed body. Encodings that
+# don't make the body smaller are left out.
+def compress(body: bytes) -> Dict[str, bytes]:
+    variants = {}
+    if brotli is not None:
+        variants["br"] = brotli.compress(body, quality=BROTLI_QUALITY)
+    variants["gzip"] = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(body)}
+
+
+# The first of `available` (best first) the client accepts, or None for the identity encoding
+def negotiate(accept_encoding: Optional[str], available: Iterable[str]) -> Optional[str]:
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip().lower())
+    for encoding in available:
+        if encoding in accepted or "*" in accepted:
+            return encoding
+    return None
@@ -0,0 +1,285 @@
+import base64
+import csv
+import heapq
+import io
+import json
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, date, time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from models import Booking, BookingSeries
+from recurrence import SERIES_COLUMNS, occurrences_of, series_occurrences
+
+
+# Page size for /history; clients may ask for less, never more than the cap
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "20"))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "100"))
+# Rows fetched per round trip by /history/export, and rows per chunk written to the client
+HISTORY_EXPORT_BATCH_SIZE = int(os.getenv("HISTORY_EXPORT_BATCH_SIZE", "1000"))
+
+HISTORY_COLUMNS = (Booking.id, Booking.room_number, Booking.date, Booking.start_time, Booking.end_time)
+
+
+# ------------------- Filters -------------------
+@dataclass
+class HistoryFilters:
+    day: Optional[date] = None
+    start: Optional[time] = None
+    end: Optional[time] = None
+
+    # The start/end columns are the same on Booking and BookingSeries
+    def time_conditions(self, model) -> List[Any]:
+        conditions = []
+        if self.start is not None:
+            conditions.append(model.start_time >= self.start)
+        if self.end is not None:
+            conditions.append(model.end_time <= self.end)
+        return conditions
+
+    def booking_conditions(self) -> List[Any]:
+        conditions = [Booking.date == self.day] if self.day is not None else []
+        return conditions + self.time_conditions(Booking)
+
+
+# Same rules /history has always applied: times only count together with a date,
+# and filters parsed before a bad value are still applied.
+def parse_history_filters(
+    date_str: Optional[str],
+    start_time: Optional[str],
+    end_time: Optional[str]
+) -> Tuple[HistoryFilters, Optional[str]]:
+    filters = HistoryFilters()
+    if (start_time or end_time) and not date_str:
+        return filters, "Please select a date when filtering by time."
+
+    warning_message = None
+
+    if date_str:
+        try:
+            filters.day = datetime.strptime(date_str, "%Y-%m-%d").date()
+        except ValueError:
+            warning_message = "Invalid date format."
+
+    if date_str and start_time:
+        try:
+            filters.start = datetime.strptime(start_time, "%H:%M").time()
+        except ValueError:
+            warning_message = "Invalid start time format."
+
+    if date_str and end_time:
+        try:
+            filters.end = datetime.strptime(end_time, "%H:%M").time()
+        except ValueError:
+            warning_message = "Invalid end time format."
+
+    return filters, warning_message
+
+
+# ------------------- Cursors -------------------
+# Opaque keyset cursor over the (date, start_time, id) sort key
+def encode_cursor(booking_date: date, start: time, booking_id: int) -> str:
+    raw = f"{booking_date.isoformat()}|{start.isoformat()}|{booking_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[date, time, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        date_part, time_part, id_part = raw.split("|")
+        return date.fromisoformat(date_part), time.fromisoformat(time_part), int(id_part)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid page cursor.")
+
+
+# ------------------- Pages -------------------
+@dataclass
+class HistoryPage:
+    rows: List[Any] = field(default_factory=list)
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+
+def page_size(limit: Optional[int]) -> int:
+    if not limit or limit < 1:
+        return HISTORY_PAGE_SIZE
+    return min(limit, HISTORY_MAX_PAGE_SIZE)
+
+
+def sort_key(row: Any) -> Tuple[date, time, int]:
+    return row.date, row.start_time, row.id
+
+
+# Newest first. `after` pages towards older bookings, `before` back towards newer ones.
+async def fetch_history_page(
+    db: AsyncSession,
+    user_id: int,
+    filters: HistoryFilters,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    limit: Optional[int] = None
+) -> HistoryPage:
+    size = page_size(limit)
+    key = tuple_(Booking.date, Booking.start_time, Booking.id)
+    query = select(*HISTORY_COLUMNS).where(Booking.user_id == user_id, *filters.booking_conditions())
+    cursor = None
+
+    if before:
+        cursor = decode_cursor(before)
+        query = query.where(key > tuple_(*cursor)).order_by(
+            Booking.date.asc(), Booking.start_time.asc(), Booking.id.asc()
+        )
+    else:
+        if after:
+            cursor = decode_cursor(after)
+            query = query.where(key < tuple_(*cursor))
+        query = query.order_by(Booking.date.desc(), Booking.start_time.desc(), Booking.id.desc())
+
+    result = await db.execute(query.limit(size + 1))
+    rows = await with_occurrences(db, user_id, filters, result.all(), cursor, bool(before), size)
+    has_more = len(rows) > size
+    rows = rows[:size]
+
+    if before:
+        rows.reverse()
+        has_newer, has_older = has_more, True
+    else:
+        has_newer, has_older = after is not None, has_more
+
+    page = HistoryPage(rows=rows)
+    if rows and has_older:
+        page.next_cursor = encode_cursor(*sort_key(rows[-1]))
+    if rows and has_newer:
+        page.prev_cursor = encode_cursor(*sort_key(rows[0]))
+    return page
+
+
+# Merges the user's recurring series into a page of bookings. Occurrences are expanded only
+# between the cursor and the last booking fetched: past that, the page is full of bookings anyway.
+async def with_occurrences(
+    db: AsyncSession,
+    user_id: int,
+    filters: HistoryFilters,
+    rows: List[Any],
+    cursor: Optional[Tuple[date, time, int]],
+    ascending: bool,
+    size: int
+) -> List[Any]:
+    first, last = date.min, date.max
+    if filters.day is not None:
+        first = last = filters.day
+    edge = rows[size].date if len(rows) > size else None
+    if ascending:
+        first = max(first, cursor[0]) if cursor else first
+        last = min(last, edge) if edge else last
+    else:
+        last = min(last, cursor[0]) if cursor else last
+        first = max(first, edge) if edge else first
+    if first > last:
+        return rows
+
+    occurrences = await series_occurrences(
+        db, first, last, BookingSeries.user_id == user_id, *filters.time_conditions(BookingSeries)
+    )
+    if cursor:
+        occurrences = [o for o in occurrences if (sort_key(o) > cursor if ascending else sort_key(o) < cursor)]
+    if not occurrences:
+        return rows
+    return sorted(rows + occurrences, key=sort_key, reverse=not ascending)[:size + 1]
+
+
+def history_item(row: Any, now: datetime) -> Dict[str, Any]:
+    ends_at = datetime.combine(row.date, row.end_time)
+    return {
+        "id": row.id,
+        "room_number": row.room_number,
+        "date": row.date.isoformat(),
+        "start_time": row.start_time.isoformat(timespec="minutes"),
+        "end_time": row.end_time.isoformat(timespec="minutes"),
+        "is_expired": now >= ends_at,
+        # Single occurrences of a series can't be edited, only the whole series deleted
+        "can_edit": now < ends_at and not hasattr(row, "series_id"),
+        "series_id": getattr(row, "series_id", None)
+    }
+
+
+# ------------------- Export -------------------
+EXPORT_FIELDS = ("id", "series_id", "name", "room_number", "date", "start_time", "end_time")
+
+
+# Every booking and series occurrence of the user matching `filters`, oldest first.
+# Bookings come through a server-side cursor HISTORY_EXPORT_BATCH_SIZE rows at a time and series
+# are expanded lazily, so memory use doesn't grow with the number of rows.
+# Runs in its own session: the request's session is closed before a streamed body is sent.
+async def export_rows(user_id: int, filters: HistoryFilters) -> AsyncIterator[Dict[str, Any]]:
+    first = last = filters.day
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(*SERIES_COLUMNS, BookingSeries.name)
+            .where(BookingSeries.user_id == user_id, *filters.time_conditions(BookingSeries))
+        )
+        series = result.all()
+        names = {row.id: row.name for row in series}
+        occurrences = heapq.merge(
+            *(occurrences_of(row[:len(SERIES_COLUMNS)], first or date.min, last or date.max) for row in series),
+            key=sort_key
+        )
+        occurrence = next(occurrences, None)
+
+        bookings = await db.stream(
+            select(*HISTORY_COLUMNS, Booking.name)
+            .where(Booking.user_id == user_id, *filters.booking_conditions())
+            .order_by(Booking.date, Booking.start_time, Booking.id)
+            .execution_options(yield_per=HISTORY_EXPORT_BATCH_SIZE)
+        )
+        async for booking in bookings:
+            while occurrence is not None and sort_key(occurrence) < sort_key(booking):
+                yield export_item(occurrence, names[occurrence.series_id])
+                occurrence = next(occurrences, None)
+            yield export_item(booking, booking.name)
+
+        while occurrence is not None:
+            yield export_item(occurrence, names[occurrence.series_id])
+            occurrence = next(occurrences, None)
+
+
+def export_item(row: Any, name: str) -> Dict[str, Any]:
+    return {
+        "id": row.id if row.id > 0 else None,
+        "series_id": getattr(row, "series_id", None),
+        "name": name,
+        "room_number": row.room_number,
+        "date": row.date.isoformat(),
+        "start_time": row.start_time.isoformat(timespec="minutes"),
+        "end_time": row.end_time.isoformat(timespec="minutes")
+    }
+
+
+async def export_csv(rows: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    count = 0
+    async for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % HISTORY_EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+async def export_ndjson(rows: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    chunk = []
+    async for row in rows:
+        chunk.append(json.dumps(row) + "\n")
+        if len(chunk) == HISTORY_EXPORT_BATCH_SIZE:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
@@ -0,0 +1,85 @@
+import os
+import time
+from typing import AbstractSet, Any, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Room
+from notifications import hub
+
+
+# Re-read the rooms table at least this often, to pick up edits made outside the app
+ROOM_INVENTORY_TTL = float(os.getenv("ROOM_INVENTORY_TTL", "300"))
+
+
+class RoomInfo(NamedTuple):
+    number: int
+    name: Optional[str]
+    capacity: int
+    attributes: Dict[str, Any]
+
+
+# Active rooms, cached per worker. Dropped on a "rooms" notification (see rooms_changed)
+# or after ROOM_INVENTORY_TTL seconds, whichever comes first.
+class RoomInventory:
+    def __init__(self, ttl: float = ROOM_INVENTORY_TTL):
+        self.ttl = ttl
+        self.rooms: Tuple[RoomInfo, ...] = ()
+        self.numbers: FrozenSet[int] = frozenset()
+        self._by_number: Dict[int, RoomInfo] = {}
+        self._loaded_at: Optional[float] = None
+        # Bumped whenever a reload finds different rooms; part of the availability ETag
+        self.generation = 0
+
+    async def load(self, db: AsyncSession) -> "RoomInventory":
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return self
+
+        result = await db.execute(
+            select(Room.number, Room.name, Room.capacity, Room.attributes)
+            .where(Room.is_active.is_(True))
+            .order_by(Room.number)
+        )
+        rooms = tuple(RoomInfo(number, name, capacity, attributes or {}) for number, name, capacity, attributes in result)
+        if rooms != self.rooms:
+            self.generation += 1
+        self.rooms = rooms
+        self.numbers = frozenset(room.number for room in self.rooms)
+        self._by_number = {room.number: room for room in self.rooms}
+        self._loaded_at = time.monotonic()
+        return self
+
+    def get(self, number: int) -> Optional[RoomInfo]:
+        return self._by_number.get(number)
+
+    # Rooms meeting optional constraints: an allow-list of numbers, a minimum capacity,
+    # and attributes that must be truthy (e.g. ["projector"])
+    def matching(
+        self,
+        numbers: Optional[AbstractSet[int]] = None,
+        min_capacity: int = 0,
+        features: Tuple[str, ...] = ()
+    ) -> List[RoomInfo]:
+        return [
+            room for room in self.rooms
+            if (numbers is None or room.number in numbers)
+            and room.capacity >= min_capacity
+            and all(room.attributes.get(feature) for feature in features)
+        ]
+
+    # Free rooms in room-number order: a set difference against the booked rooms
+    def available(self, booked: AbstractSet[int]) -> List[int]:
+        return sorted(self.numbers - booked)
+
+    def invalidate(self, message: Optional[Dict[str, Any]] = None) -> None:
+        self._loaded_at = None
+
+
+room_inventory = RoomInventory()
+hub.subscribe("rooms", room_inventory.invalidate)
+
+
+# Call after adding, editing or retiring rooms
+async def rooms_changed() -> None:
+    await hub.publish("rooms", {})
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import os
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Set, Tuple
+
+from database import AsyncSessionLocal
+from inventory import room_inventory
+from notifications import hub
+from occupancy import occupancy_index
+
+
+# Idle subscribers get a comment line this often, so proxies don't drop the connection
+LIVE_FEED_HEARTBEAT = float(os.getenv("LIVE_FEED_HEARTBEAT", "15"))
+# Open feeds per worker; further subscribers get a 503
+LIVE_FEED_MAX_SUBSCRIBERS = int(os.getenv("LIVE_FEED_MAX_SUBSCRIBERS", "10000"))
+
+
+# Fan-out of occupancy changes to Server-Sent Events subscribers, per date.
+# A subscriber is just an asyncio.Event: a change sets the events of that date's subscribers,
+# and each of them then sends the shared snapshot for the new version. The snapshot is built
+# (from the occupancy index, so usually without a query) and encoded once per version, however
+# many subscribers there are, and a burst of changes collapses into one message.
+class AvailabilityFeed:
+    def __init__(self, max_subscribers: int = LIVE_FEED_MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self._subscribers: Dict[date, Set[asyncio.Event]] = defaultdict(set)
+        self._count = 0
+        self._snapshots: Dict[date, Tuple[int, str]] = {}
+        self._locks: Dict[date, asyncio.Lock] = {}
+
+    @property
+    def subscribers(self) -> int:
+        return self._count
+
+    @property
+    def full(self) -> bool:
+        return self._count >= self.max_subscribers
+
+    @contextmanager
+    def subscribe(self, day: date) -> Iterator[asyncio.Event]:
+        event = asyncio.Event()
+        self._subscribers[day].add(event)
+        self._count += 1
+        try:
+            yield event
+        finally:
+            self._count -= 1
+            self._subscribers[day].discard(event)
+            if not self._subscribers[day]:
+                del self._subscribers[day]
+                self._snapshots.pop(day, None)
+                self._locks.pop(day, None)
+
+    # Listener on the "occupancy" channel: local writes and, with NOTIFY_BACKEND=postgres,
+    # writes made by other workers
+    def on_change(self, message: Dict[str, Any]) -> None:
+        for day in message["dates"]:
+            for event in self._subscribers.get(date.fromisoformat(day), ()):
+                event.set()
+
+    # (version, SSE message) for the current state of `day`
+    async def snapshot(self, day: date) -> Tuple[int, str]:
+        lock = self._locks.setdefault(day, asyncio.Lock())
+        async with lock:
+            version = occupancy_index.version(day)
+            cached = self._snapshots.get(day)
+            if cached is not None and cached[0] == version:
+                return cached
+
+            async with AsyncSessionLocal() as db:
+                inventory = await room_inventory.load(db)
+                occupancy = await occupancy_index.day(db, day)
+            payload = {
+                "date": day.isoformat(),
+                "rooms": [room.number for room in inventory.rooms],
+                "booked": {
+                    str(room): [
+                        [start.isoformat(timespec="minutes"), end.isoformat(timespec="minutes"), booking_id]
+                        for start, end, booking_id in intervals
+                    ]
+                    for room, intervals in sorted(occupancy.rooms.items()) if intervals
+                }
+            }
+            message = f"event: occupancy\nid: {version}\ndata: {json.dumps(payload)}\n\n"
+            if day in self._subscribers:
+                self._snapshots[day] = (version, message)
+            return version, message
+
+    # SSE body for one subscriber: the current snapshot, then one message per change.
+    # Runs until the client disconnects (Starlette cancels the body then).
+    async def stream(self, day: date) -> AsyncIterator[str]:
+        with self.subscribe(day) as event:
+            sent: Optional[int] = None
+            while True:
+                event.clear()
+                version, message = await self.snapshot(day)
+                if version != sent:
+                    sent = version
+                    yield message
+                try:
+                    await asyncio.wait_for(event.wait(), LIVE_FEED_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+
+
+availability_feed = AvailabilityFeed()
+hub.subscribe("occupancy", availability_feed.on_change)
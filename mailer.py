@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from email.utils import formataddr
+from typing import Optional
+
+import aiosmtplib
+from dotenv import load_dotenv
+from fastapi_mail import ConnectionConfig
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from metrics import EMAIL_SEND_LATENCY
+from models import EmailOutbox
+
+
+logger = logging.getLogger(__name__)
+
+load_dotenv("/etc/secrets/.env") if os.path.exists("/etc/secrets/.env") else load_dotenv()
+
+# Configure FastAPI-Mail
+conf = ConnectionConfig(
+    MAIL_USERNAME=os.getenv("MAIL_USERNAME"),
+    MAIL_PASSWORD=os.getenv("MAIL_PASSWORD"),
+    MAIL_FROM=os.getenv("MAIL_FROM"),
+    MAIL_FROM_NAME=os.getenv("MAIL_FROM_NAME", "Room Booking App"),
+    MAIL_PORT=int(os.getenv("MAIL_PORT", 587)),
+    MAIL_SERVER=os.getenv("MAIL_SERVER", "smtp.gmail.com"),
+    MAIL_STARTTLS=os.getenv("MAIL_STARTTLS", "True").lower() == "true",
+    MAIL_SSL_TLS=os.getenv("MAIL_SSL_TLS", "False").lower() == "true",
+    USE_CREDENTIALS=os.getenv("USE_CREDENTIALS", "True").lower() == "true",
+    VALIDATE_CERTS=os.getenv("VALIDATE_CERTS", "True").lower() == "true"
+)
+
+# Outbox worker config
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "10"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_RETRY_BASE = float(os.getenv("OUTBOX_RETRY_BASE", "30"))  # seconds, doubled per attempt
+# Sent/failed rows are deleted this many days after they were queued
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "30"))
+OUTBOX_PURGE_INTERVAL = float(os.getenv("OUTBOX_PURGE_INTERVAL", "3600"))  # seconds
+
+# Bodies carry live password-reset links; nothing needs them once a row is sent or has failed
+# for good, so they are blanked then (the column is NOT NULL)
+REDACTED_BODY = ""
+TERMINAL_STATUSES = ("sent", "failed")
+
+
+# ------------------- Enqueue -------------------
+async def enqueue_email(db: AsyncSession, recipient: str, subject: str, body: str) -> None:
+    db.add(EmailOutbox(recipient=recipient, subject=subject, body=body))
+    await db.commit()
+    outbox_worker.wake()
+
+
+def build_message(item: EmailOutbox) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = formataddr((conf.MAIL_FROM_NAME, conf.MAIL_FROM))
+    message["To"] = item.recipient
+    message["Subject"] = item.subject
+    message.set_content(item.body)
+    return message
+
+
+def retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(OUTBOX_RETRY_BASE * 2 ** (attempts - 1), 3600))
+
+
+# ------------------- Worker -------------------
+# Drains the outbox in batches over one SMTP connection that is kept open between batches.
+# Rows are claimed with FOR UPDATE SKIP LOCKED, so every uvicorn worker can run a drainer.
+class OutboxWorker:
+    def __init__(self):
+        self._smtp: Optional[aiosmtplib.SMTP] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._last_purge: Optional[float] = None
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    async def _connection(self) -> aiosmtplib.SMTP:
+        if self._smtp is None or not self._smtp.is_connected:
+            smtp = aiosmtplib.SMTP(
+                hostname=conf.MAIL_SERVER,
+                port=conf.MAIL_PORT,
+                use_tls=conf.MAIL_SSL_TLS,
+                start_tls=conf.MAIL_STARTTLS,
+                validate_certs=conf.VALIDATE_CERTS
+            )
+            await smtp.connect()
+            if conf.USE_CREDENTIALS:
+                await smtp.login(conf.MAIL_USERNAME, conf.MAIL_PASSWORD.get_secret_value())
+            self._smtp = smtp
+        return self._smtp
+
+    def _drop_connection(self) -> None:
+        if self._smtp is not None:
+            self._smtp.close()
+            self._smtp = None
+
+    async def _send(self, item: EmailOutbox) -> None:
+        message = build_message(item)
+        try:
+            smtp = await self._connection()
+            await smtp.send_message(message)
+        except aiosmtplib.SMTPServerDisconnected:
+            # Server dropped the idle connection; reconnect once
+            self._drop_connection()
+            smtp = await self._connection()
+            await smtp.send_message(message)
+
+    async def drain(self) -> int:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(EmailOutbox)
+                .where(EmailOutbox.status == "pending", EmailOutbox.next_attempt_at <= datetime.now())
+                .order_by(EmailOutbox.next_attempt_at)
+                .limit(OUTBOX_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            )
+            batch = result.scalars().all()
+
+            for item in batch:
+                item.attempts += 1
+                started = time.perf_counter()
+                try:
+                    await self._send(item)
+                    EMAIL_SEND_LATENCY.labels("sent").observe(time.perf_counter() - started)
+                    item.status = "sent"
+                    item.sent_at = datetime.now()
+                    item.last_error = None
+                    item.body = REDACTED_BODY
+                except Exception as exc:
+                    EMAIL_SEND_LATENCY.labels("failed").observe(time.perf_counter() - started)
+                    logger.warning("Sending email %s failed (attempt %s): %s", item.id, item.attempts, exc)
+                    self._drop_connection()
+                    item.last_error = str(exc)[:500]
+                    if item.attempts >= OUTBOX_MAX_ATTEMPTS:
+                        item.status = "failed"
+                        item.body = REDACTED_BODY
+                    else:
+                        item.next_attempt_at = datetime.now() + retry_delay(item.attempts)
+
+            await db.commit()
+            return len(batch)
+
+    # Deletes terminal rows past the retention period and blanks any bodies still left on
+    # terminal rows (e.g. written before bodies were redacted)
+    async def purge(self) -> int:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                delete(EmailOutbox).where(
+                    EmailOutbox.status.in_(TERMINAL_STATUSES),
+                    EmailOutbox.created_at < datetime.now() - timedelta(days=OUTBOX_RETENTION_DAYS)
+                )
+            )
+            await db.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.status.in_(TERMINAL_STATUSES), EmailOutbox.body != REDACTED_BODY)
+                .values(body=REDACTED_BODY)
+            )
+            await db.commit()
+            return result.rowcount
+
+    async def run(self) -> None:
+        while True:
+            try:
+                # Keep going while full batches come back
+                while await self.drain() >= OUTBOX_BATCH_SIZE:
+                    pass
+            except Exception:
+                logger.exception("Email outbox drain failed")
+
+            if self._last_purge is None or time.monotonic() - self._last_purge >= OUTBOX_PURGE_INTERVAL:
+                self._last_purge = time.monotonic()
+                try:
+                    purged = await self.purge()
+                    if purged:
+                        logger.info("Purged %s old email outbox rows", purged)
+                except Exception:
+                    logger.exception("Email outbox purge failed")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self._smtp is not None and self._smtp.is_connected:
+            try:
+                await self._smtp.quit()
+            except aiosmtplib.SMTPException:
+                pass
+        self._smtp = None
+
+
+outbox_worker = OutboxWorker()
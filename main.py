@@ -1,20 +1,53 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
-from database import Base, engine
-from routers import booking, user
+from assets import AssetFiles, asset_manifest
+from auth import password_hasher
+from database import Base, engine, async_engine
+from mailer import outbox_worker
+from metrics import MetricsMiddleware, worker_exited
+from migrations import run_migrations, schema_lock
+from notifications import hub
+from querystats import QueryStatsMiddleware, instrument
+from routers import booking, internal, monitoring, rooms, user
+from templating import page_cache, precompile_templates
+
+with schema_lock(engine):
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+# Statement counts and DB time per request (Server-Timing header, slow-request log)
+instrument(engine)
+instrument(async_engine.sync_engine)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    asset_manifest.load()
+    precompile_templates()
+    await hub.start()
+    outbox_worker.start()
+    yield
+    await outbox_worker.stop()
+    await hub.stop()
+    password_hasher.shutdown()
+    await async_engine.dispose()
+    worker_exited()
 
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(QueryStatsMiddleware)
+app.add_middleware(MetricsMiddleware)
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
+app.mount("/static", AssetFiles(directory="static"), name="static")
 
 @app.get("/", include_in_schema=False)
 def home(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return page_cache.response(request, "index.html")
 
 
 app.include_router(user.router)
 app.include_router(booking.router)
+app.include_router(rooms.router)
+app.include_router(internal.router)
+app.include_router(monitoring.router)
@@ -0,0 +1,124 @@
+import os
+import time
+
+# database loads .env first: prometheus_client picks its (multiprocess or not) value class from
+# PROMETHEUS_MULTIPROC_DIR when the first metric is created
+from database import async_engine
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+
+# With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR to a directory shared by them (and
+# emptied before they start): every worker writes its samples there, and /metrics on any worker
+# reports all of them. Without it, /metrics only covers the worker that answers.
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Seconds; spans fast cached pages up to bcrypt logins under load
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+# ------------------- Metrics -------------------
+# Gauges are summed over live workers ("livesum"); a worker's samples are dropped when it exits
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time to the end of the response body, per route",
+    ["method", "route"], buckets=LATENCY_BUCKETS
+)
+REQUESTS = Counter("http_requests_total", "Responses sent, per route and status", ["method", "route", "status"])
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Requests being handled", ["method"], multiprocess_mode="livesum"
+)
+
+DB_POOL_SIZE = Gauge("db_pool_size", "Configured connections in the async engine pool", multiprocess_mode="livesum")
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections in use", multiprocess_mode="livesum")
+DB_POOL_CHECKED_IN = Gauge("db_pool_checked_in", "Idle connections in the pool", multiprocess_mode="livesum")
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections opened beyond the pool size", multiprocess_mode="livesum")
+
+PASSWORD_HASH_RUNNING = Gauge("password_hash_running", "bcrypt hashes being computed", multiprocess_mode="livesum")
+PASSWORD_HASH_QUEUED = Gauge("password_hash_queued", "bcrypt hashes waiting for a worker thread", multiprocess_mode="livesum")
+PASSWORD_HASH_REJECTED = Counter("password_hash_rejected", "Logins/registrations shed with a 503 (queue full)")
+
+EMAIL_SEND_LATENCY = Histogram(
+    "email_send_duration_seconds", "SMTP send time per outbox email, including reconnects",
+    ["outcome"], buckets=LATENCY_BUCKETS
+)
+
+TEMPLATE_RENDER_LATENCY = Histogram(
+    "template_render_duration_seconds", "Jinja render time per template", ["template"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+)
+
+
+# ------------------- DB pool -------------------
+# Refreshed on every checkout/checkin, so each worker's current figures are in the shared files
+# whichever worker is scraped
+def _update_pool_gauges(*_) -> None:
+    pool = async_engine.pool
+    if isinstance(pool, QueuePool):
+        DB_POOL_SIZE.set(pool.size())
+        DB_POOL_CHECKED_OUT.set(pool.checkedout())
+        DB_POOL_CHECKED_IN.set(pool.checkedin())
+        DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+
+
+event.listen(async_engine.sync_engine, "checkout", _update_pool_gauges)
+event.listen(async_engine.sync_engine, "checkin", _update_pool_gauges)
+
+
+# ------------------- Exposition -------------------
+def render_metrics() -> bytes:
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+# Called when a worker shuts down, so its live gauges stop counting towards the totals
+def worker_exited() -> None:
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+# ------------------- Middleware -------------------
+# Route label: the route's path template ("/update-booking/{booking_id}") or mount path
+# ("/static"), never the raw path, so the number of series stays bounded
+def route_label(scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if "endpoint" in scope:
+        return scope["root_path"][len(scope.get("app_root_path", "")):] or "/"
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            route = route_label(scope)
+            REQUEST_LATENCY.labels(method, route).observe(time.perf_counter() - started)
+            REQUESTS.labels(method, route, str(status)).inc()
@@ -0,0 +1,102 @@
+import os
+from contextlib import contextmanager
+from typing import Callable, List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from models import Booking, Room
+
+
+# Optional PostgreSQL exclusion constraint that makes the database itself reject overlapping bookings
+BOOKING_EXCLUSION_CONSTRAINT = os.getenv("BOOKING_EXCLUSION_CONSTRAINT", "False").lower() == "true"
+
+
+# ------------------- Migrations -------------------
+# create_all() only creates missing tables, so indexes/constraints added to existing
+# tables are applied here. Each migration is recorded in schema_migrations once it has run.
+
+def _create_booking_index(name: str) -> Callable[[Connection], bool]:
+    def migrate(conn: Connection) -> bool:
+        for index in Booking.__table__.indexes:
+            if index.name == name:
+                index.create(bind=conn, checkfirst=True)
+        return True
+    return migrate
+
+
+# Skipped (and retried on the next start) until enabled on a PostgreSQL database
+def _booking_exclusion_constraint(conn: Connection) -> bool:
+    if conn.dialect.name != "postgresql" or not BOOKING_EXCLUSION_CONSTRAINT:
+        return False
+
+    conn.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+    conn.execute(text("""
+        ALTER TABLE bookings
+        ADD COLUMN IF NOT EXISTS during tsrange
+        GENERATED ALWAYS AS (tsrange(date + start_time, date + end_time, '[)')) STORED
+    """))
+    exists = conn.execute(
+        text("SELECT 1 FROM pg_constraint WHERE conname = 'bookings_no_overlap'")
+    ).first()
+    if not exists:
+        conn.execute(text("""
+            ALTER TABLE bookings
+            ADD CONSTRAINT bookings_no_overlap
+            EXCLUDE USING gist (room_number WITH =, during WITH &&)
+        """))
+    return True
+
+
+# Rooms 1-10 were hard-coded before the rooms table existed
+def _seed_rooms(conn: Connection) -> bool:
+    if conn.execute(Room.__table__.select().limit(1)).first() is None:
+        conn.execute(Room.__table__.insert(), [
+            {"number": n, "name": f"Room {n}", "capacity": 1, "attributes": {}, "is_active": True}
+            for n in range(1, 11)
+        ])
+    return True
+
+
+MIGRATIONS: List[Tuple[str, Callable[[Connection], bool]]] = [
+    ("0001_booking_overlap_index", _create_booking_index("ix_bookings_date_room_time")),
+    ("0002_booking_exclusion_constraint", _booking_exclusion_constraint),
+    ("0003_booking_history_index", _create_booking_index("ix_bookings_user_history")),
+    ("0004_seed_rooms", _seed_rooms),
+]
+
+
+# Every uvicorn worker runs create_all() and the migrations at import. On PostgreSQL they take
+# turns under a session advisory lock (a single-key lock, so it never clashes with the two-key
+# slot locks); the workers that wait find the schema up to date and apply nothing.
+SCHEMA_LOCK_KEY = 72_410_001
+
+
+@contextmanager
+def schema_lock(engine: Engine):
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+        conn.commit()
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SCHEMA_LOCK_KEY})
+            conn.commit()
+
+
+def run_migrations(engine: Engine) -> None:
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS schema_migrations (version VARCHAR PRIMARY KEY)"))
+        applied = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+    for version, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        with engine.begin() as conn:
+            if not migrate(conn):
+                continue
+            conn.execute(text("INSERT INTO schema_migrations (version) VALUES (:v)"), {"v": version})
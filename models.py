@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, Time, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Boolean, Date, Time, DateTime, JSON, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -14,6 +14,17 @@ class User(Base):
     bookings = relationship("Booking", back_populates="user")
 
 
+# Bookable rooms; the app's cached copy lives in inventory.py
+class Room(Base):
+    __tablename__ = "rooms"
+
+    number = Column(Integer, primary_key=True)
+    name = Column(String, nullable=True)
+    capacity = Column(Integer, nullable=False, default=1)
+    attributes = Column(JSON, nullable=False, default=dict)  # e.g. {"projector": true, "floor": 2}
+    is_active = Column(Boolean, nullable=False, default=True)
+
+
 class Booking(Base):
     __tablename__ = "bookings"
 
@@ -27,4 +38,51 @@ class Booking(Base):
 
     user = relationship("User", back_populates="bookings")
 
+    # Conflict checks filter on date + room and an overlap on start/end;
+    # /history pages through a user's bookings by (date, start_time, id)
+    __table_args__ = (
+        Index("ix_bookings_date_room_time", "date", "room_number", "start_time", "end_time"),
+        Index("ix_bookings_user_history", "user_id", "date", "start_time", "id"),
+    )
+
+
+# A booking that repeats, e.g. "room 3 every Monday 10:00-11:00 until April". Occurrences are
+# not stored; they are expanded from `rule` (see recurrence.py) only for the dates a query needs.
+class BookingSeries(Base):
+    __tablename__ = "booking_series"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    name = Column(String, nullable=False)
+    room_number = Column(Integer, nullable=False)
+    start_time = Column(Time, nullable=False)
+    end_time = Column(Time, nullable=False)
+    rule = Column(String, nullable=False)  # RRULE, e.g. FREQ=WEEKLY;BYDAY=MO;UNTIL=20270419
+    first_date = Column(Date, nullable=False)  # DTSTART
+    last_date = Column(Date, nullable=False)  # last occurrence, so date windows can be filtered in SQL
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (
+        Index("ix_booking_series_dates", "first_date", "last_date"),
+        Index("ix_booking_series_user", "user_id", "last_date"),
+    )
+
+
+# Outgoing emails, queued by request handlers and sent by the background outbox worker
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending / sent / failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.now)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+    sent_at = Column(DateTime, nullable=True)
 
+    __table_args__ = (
+        Index("ix_email_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
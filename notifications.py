@@ -0,0 +1,101 @@
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from typing import Any, Callable, Dict, List
+from uuid import uuid4
+
+from sqlalchemy.engine import make_url
+
+from database import DATABASE_URL
+
+
+logger = logging.getLogger(__name__)
+
+# "local": messages stay inside this worker process.
+# "postgres": messages are also fanned out to every other worker through LISTEN/NOTIFY.
+# Defaults to "postgres" on PostgreSQL, where several workers (each with its own occupancy
+# index) are the norm.
+NOTIFY_BACKEND = os.getenv(
+    "NOTIFY_BACKEND", "postgres" if make_url(DATABASE_URL).get_backend_name() == "postgresql" else "local"
+).lower()
+
+# Lets a worker skip its own NOTIFY echoes (it already delivered them locally)
+WORKER_ID = uuid4().hex
+
+Listener = Callable[[Dict[str, Any]], None]
+
+
+class NotificationHub:
+    def __init__(self, backend: str = NOTIFY_BACKEND):
+        self.backend = backend
+        self._listeners: Dict[str, List[Listener]] = defaultdict(list)
+        self._conn = None
+        self._stopping = False
+
+    # Register listeners at import time; channels are LISTENed to when the hub starts
+    def subscribe(self, channel: str, listener: Listener) -> None:
+        self._listeners[channel].append(listener)
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        self._dispatch(channel, message)
+
+        if self._conn is not None and not self._conn.is_closed():
+            payload = json.dumps({"origin": WORKER_ID, "message": message}, default=str)
+            try:
+                await self._conn.execute("SELECT pg_notify($1, $2)", channel, payload)
+            except Exception:
+                logger.exception("Failed to publish notification on %s", channel)
+
+    def _dispatch(self, channel: str, message: Dict[str, Any]) -> None:
+        for listener in self._listeners.get(channel, []):
+            try:
+                listener(message)
+            except Exception:
+                logger.exception("Notification listener failed on %s", channel)
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        data = json.loads(payload)
+        if data.get("origin") != WORKER_ID:
+            self._dispatch(channel, data["message"])
+
+    def _on_terminate(self, connection) -> None:
+        if not self._stopping:
+            logger.warning("LISTEN connection lost, reconnecting")
+            self._conn = None
+            asyncio.get_running_loop().create_task(self._connect(retry=True))
+
+    async def _connect(self, retry: bool = False) -> None:
+        import asyncpg
+
+        dsn = make_url(DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+        delay = 1
+        while not self._stopping:
+            try:
+                conn = await asyncpg.connect(dsn)
+                for channel in self._listeners:
+                    await conn.add_listener(channel, self._on_notify)
+                conn.add_termination_listener(self._on_terminate)
+                self._conn = conn
+                return
+            except Exception:
+                if not retry:
+                    raise
+                logger.exception("LISTEN reconnect failed, retrying in %ss", delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+    async def start(self) -> None:
+        self._stopping = False
+        if self.backend == "postgres" and self._conn is None:
+            await self._connect()
+
+    async def stop(self) -> None:
+        self._stopping = True
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+
+hub = NotificationHub()
@@ -0,0 +1,225 @@
+import itertools
+import os
+import time as timer
+from bisect import bisect_left, insort
+from collections import OrderedDict, defaultdict
+from datetime import date, time
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Booking, User
+from notifications import WORKER_ID, hub
+from recurrence import series_occurrences
+
+
+# (room_number, start_time, end_time, username) rows for a single day.
+# Nothing is queried until load() is awaited, so pages that don't render it cost no DB work.
+class RoomOccupancy:
+    def __init__(self, day: date):
+        self.day = day
+        self._rows: Optional[List[Tuple]] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._rows is not None
+
+    async def load(self, db: AsyncSession) -> "RoomOccupancy":
+        if self._rows is None:
+            result = await db.execute(
+                select(Booking.room_number, Booking.start_time, Booking.end_time, User.username)
+                .join(User, Booking.user_id == User.id)
+                .where(Booking.date == self.day)
+                .order_by(Booking.room_number, Booking.start_time)
+            )
+            self._rows = [tuple(row) for row in result]
+        return self
+
+    def __iter__(self) -> Iterator[Tuple]:
+        return iter(self._rows or [])
+
+    def __len__(self) -> int:
+        return len(self._rows or [])
+
+
+# ------------------- Interval index -------------------
+# Width of one cell of the /rooms/grid occupancy grid; 96 slots per day
+GRID_SLOT_MINUTES = 15
+GRID_SLOTS = 24 * 60 // GRID_SLOT_MINUTES
+
+
+class Slot(NamedTuple):
+    booking_id: int
+    room_number: int
+    date: date
+    start_time: time
+    end_time: time
+
+    @classmethod
+    def of(cls, booking: Booking) -> "Slot":
+        return cls(booking.id, booking.room_number, booking.date, booking.start_time, booking.end_time)
+
+
+# Every booking of one day as per-room arrays of (start, end, booking_id), sorted by start.
+# Occurrences of recurring series are in here too, under their negative Occurrence.id.
+class DayOccupancy:
+    def __init__(self, rows=()):
+        self.rooms: Dict[int, List[Tuple[time, time, int]]] = defaultdict(list)
+        for booking_id, room_number, start, end in rows:
+            self.rooms[room_number].append((start, end, booking_id))
+        for intervals in self.rooms.values():
+            intervals.sort()
+
+    # Idempotent: a day loaded after the write committed already has the booking when the
+    # change is applied to it
+    def add(self, booking_id: int, room_number: int, start: time, end: time) -> None:
+        self.remove(booking_id)
+        insort(self.rooms[room_number], (start, end, booking_id))
+
+    def remove(self, booking_id: int) -> None:
+        for intervals in self.rooms.values():
+            intervals[:] = [interval for interval in intervals if interval[2] != booking_id]
+
+    def is_booked(self, room_number: int, start: time, end: time, exclude_booking_id: Optional[int] = None) -> bool:
+        intervals = self.rooms.get(room_number)
+        if not intervals:
+            return False
+        # Only intervals starting before `end` can overlap [start, end)
+        for other_start, other_end, booking_id in reversed(intervals[:bisect_left(intervals, (end,))]):
+            if other_end > start and booking_id != exclude_booking_id:
+                return True
+        return False
+
+    def booked_rooms(self, start: time, end: time, exclude_booking_id: Optional[int] = None) -> Set[int]:
+        return {r for r in self.rooms if self.is_booked(r, start, end, exclude_booking_id)}
+
+    # Per room, an int whose bit i is set when anything overlaps slot i
+    # ([i * GRID_SLOT_MINUTES, (i + 1) * GRID_SLOT_MINUTES) minutes after midnight)
+    def slot_masks(self) -> Dict[int, int]:
+        masks = {}
+        for room_number, intervals in self.rooms.items():
+            mask = 0
+            for start, end, _ in intervals:
+                first = (start.hour * 60 + start.minute) // GRID_SLOT_MINUTES
+                last = (end.hour * 60 + end.minute + GRID_SLOT_MINUTES - 1) // GRID_SLOT_MINUTES
+                mask |= ((1 << (last - first)) - 1) << first
+            if mask:
+                masks[room_number] = mask
+        return masks
+
+
+# Per-process cache of DayOccupancy, loaded lazily (once per day) and kept current by
+# booking_changed(). Other workers drop their copy of a day when they get the change
+# notification (NOTIFY_BACKEND=postgres), so a day is reloaded after someone else writes to it.
+# Without notifications (or for writes made outside the app) a day is reloaded once it is
+# OCCUPANCY_INDEX_TTL seconds old.
+OCCUPANCY_INDEX_DAYS = int(os.getenv("OCCUPANCY_INDEX_DAYS", "366"))
+OCCUPANCY_INDEX_TTL = float(os.getenv("OCCUPANCY_INDEX_TTL", "60"))
+
+
+class OccupancyIndex:
+    def __init__(self, max_days: int = OCCUPANCY_INDEX_DAYS, ttl: float = OCCUPANCY_INDEX_TTL):
+        self.max_days = max_days
+        self.ttl = ttl
+        self._days: "OrderedDict[date, DayOccupancy]" = OrderedDict()
+        self._loaded_at: Dict[date, float] = {}
+        # Versions change on every write to a day, so a load that raced with a write isn't cached
+        # and ETags built from them change. They come from one increasing counter and are only
+        # kept for cached days: every other day shares _floor, which moves past every version
+        # handed out so far whenever an uncached day is written or a cached one is evicted.
+        # Reads never add entries, and a day's version never goes back to an earlier value.
+        self._clock = itertools.count(1)
+        self._floor = 0
+        self._versions: Dict[date, int] = {}
+
+    def version(self, day: date) -> int:
+        self._expire(day)
+        return self._versions.get(day, self._floor)
+
+    # A day past its TTL counts as changed: dropped, with a new version
+    def _expire(self, day: date) -> None:
+        loaded_at = self._loaded_at.get(day)
+        if loaded_at is not None and timer.monotonic() - loaded_at >= self.ttl:
+            self.invalidate(day)
+
+    def _bump(self, day: date) -> None:
+        if day in self._days:
+            self._versions[day] = next(self._clock)
+        else:
+            self._floor = next(self._clock)
+
+    def _evict(self, day: date) -> None:
+        del self._days[day]
+        self._loaded_at.pop(day, None)
+        self._floor = max(self._floor, self._versions.pop(day, self._floor))
+
+    async def day(self, db: AsyncSession, day: date) -> DayOccupancy:
+        self._expire(day)
+        occupancy = self._days.get(day)
+        if occupancy is not None:
+            self._days.move_to_end(day)
+            return occupancy
+
+        version = self.version(day)
+        result = await db.execute(
+            select(Booking.id, Booking.room_number, Booking.start_time, Booking.end_time)
+            .where(Booking.date == day)
+        )
+        rows = result.all()
+        # Recurring series are expanded for this one day only
+        rows.extend(
+            (occurrence.id, occurrence.room_number, occurrence.start_time, occurrence.end_time)
+            for occurrence in await series_occurrences(db, day, day)
+        )
+        occupancy = DayOccupancy(rows)
+
+        if self.version(day) == version:
+            self._days[day] = occupancy
+            self._loaded_at[day] = timer.monotonic()
+            self._versions[day] = version
+            while len(self._days) > self.max_days:
+                self._evict(next(iter(self._days)))
+        return occupancy
+
+    def invalidate(self, day: date) -> None:
+        if day in self._days:
+            self._evict(day)
+        self._bump(day)
+
+    def _apply(self, old: Optional[Slot], new: Optional[Slot]) -> List[date]:
+        changed = []
+        if old is not None:
+            self._bump(old.date)
+            if old.date in self._days:
+                self._days[old.date].remove(old.booking_id)
+            changed.append(old.date)
+        if new is not None:
+            self._bump(new.date)
+            if new.date in self._days:
+                self._days[new.date].add(new.booking_id, new.room_number, new.start_time, new.end_time)
+            if new.date not in changed:
+                changed.append(new.date)
+        return changed
+
+    # Call after committing a create (old=None), update, or delete (new=None)
+    async def booking_changed(self, old: Optional[Slot], new: Optional[Slot]) -> None:
+        await self.bookings_changed([(old, new)])
+
+    # Same for a batch of (old, new) pairs committed together; one notification for all of them
+    async def bookings_changed(self, changes: Iterable[Tuple[Optional[Slot], Optional[Slot]]]) -> None:
+        changed: List[date] = []
+        for old, new in changes:
+            changed.extend(d for d in self._apply(old, new) if d not in changed)
+        if changed:
+            await hub.publish("occupancy", {"origin": WORKER_ID, "dates": [d.isoformat() for d in changed]})
+
+    def _on_notification(self, message: Dict[str, Any]) -> None:
+        if message.get("origin") == WORKER_ID:
+            return
+        for day in message["dates"]:
+            self.invalidate(date.fromisoformat(day))
+
+
+occupancy_index = OccupancyIndex()
+hub.subscribe("occupancy", occupancy_index._on_notification)
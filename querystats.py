@@ -0,0 +1,124 @@
+import logging
+import os
+import re
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Log requests that run more statements, or spend longer in the database, than this
+QUERY_BUDGET_COUNT = int(os.getenv("QUERY_BUDGET_COUNT", "15"))
+QUERY_BUDGET_MS = float(os.getenv("QUERY_BUDGET_MS", "100"))
+# Statement fingerprints included in a slow-request log line
+QUERY_LOG_TOP = int(os.getenv("QUERY_LOG_TOP", "5"))
+
+
+# ------------------- Fingerprints -------------------
+# The statement with literals and bind parameters replaced, so the same query with different
+# values (and IN lists of any length) counts as one
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_PARAMS = re.compile(r"\$\d+|%\(\w+\)s|%s|\?|:\w+|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    statement = _STRINGS.sub("?", statement)
+    statement = _PARAMS.sub("?", statement)
+    statement = _LISTS.sub("(...)", statement)
+    return _SPACES.sub(" ", statement).strip()
+
+
+# ------------------- Per-request stats -------------------
+@dataclass
+class QueryStats:
+    count: int = 0
+    db_time: float = 0.0
+    # fingerprint -> [count, seconds]
+    statements: Dict[str, List[float]] = field(default_factory=dict)
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.db_time += elapsed
+        entry = self.statements.setdefault(fingerprint(statement), [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+
+    def top(self, n: int) -> List[str]:
+        ranked = sorted(self.statements.items(), key=lambda item: (item[1][0], item[1][1]), reverse=True)
+        return [f"{int(count)}x {seconds * 1000:.1f}ms {sql}" for sql, (count, seconds) in ranked[:n]]
+
+
+# Set for the duration of a request by QueryStatsMiddleware. SQLAlchemy runs async drivers'
+# cursor calls in a greenlet that shares the calling task's context, so the hooks below see it.
+current_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_stats", default=None)
+
+
+# The start time lives on the statement's execution context, so a statement that raises leaves
+# nothing behind on the pooled connection; it is counted by handle_error instead of
+# after_cursor_execute
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    stats = current_stats.get()
+    if started is not None and stats is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+def _handle_error(exception_context):
+    context = exception_context.execution_context
+    started = getattr(context, "_query_started", None)
+    stats = current_stats.get()
+    if started is not None and stats is not None and exception_context.statement is not None:
+        stats.record(exception_context.statement, time.perf_counter() - started)
+
+
+def instrument(engine: Engine) -> None:
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+# ------------------- Middleware -------------------
+# Adds "Server-Timing: db;desc=\"N queries\";dur=<ms>, app;dur=<ms>" to every HTTP response
+# (as of when its headers are sent) and logs requests over the query budgets.
+class QueryStatsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - started) * 1000
+                timing = f'db;desc="{stats.count} queries";dur={stats.db_time * 1000:.1f}, app;dur={total_ms:.1f}'
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_stats.reset(token)
+            db_ms = stats.db_time * 1000
+            if stats.count > QUERY_BUDGET_COUNT or db_ms > QUERY_BUDGET_MS:
+                logger.warning(
+                    "%s %s ran %d queries in %.1fms (budget %d queries / %.0fms):\n  %s",
+                    scope["method"], scope["path"], stats.count, db_ms, QUERY_BUDGET_COUNT, QUERY_BUDGET_MS,
+                    "\n  ".join(stats.top(QUERY_LOG_TOP))
+                )
@@ -0,0 +1,162 @@
+import os
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import BookingSeries
+
+
+# Longest a series may run, counted from its first date
+RECURRENCE_MAX_DAYS = int(os.getenv("RECURRENCE_MAX_DAYS", "366"))
+
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+
+
+# ------------------- Rules -------------------
+# The subset of RFC 5545 RRULE the app supports: FREQ=DAILY|WEEKLY with INTERVAL, BYDAY
+# (weekly only), COUNT and UNTIL, e.g. "FREQ=WEEKLY;BYDAY=MO;UNTIL=20270419".
+# The series' first date is DTSTART; it only counts as an occurrence if it matches the rule.
+@dataclass(frozen=True)
+class RecurrenceRule:
+    freq: str
+    interval: int = 1
+    byday: Tuple[int, ...] = ()
+    count: Optional[int] = None
+    until: Optional[date] = None
+
+    @classmethod
+    def parse(cls, text: str) -> "RecurrenceRule":
+        parts = {}
+        for part in text.strip().upper().removeprefix("RRULE:").split(";"):
+            key, sep, value = part.partition("=")
+            if not sep or not value or key in parts:
+                raise ValueError(f"Invalid recurrence rule part: {part!r}")
+            parts[key] = value
+
+        unknown = set(parts) - {"FREQ", "INTERVAL", "BYDAY", "COUNT", "UNTIL"}
+        if unknown:
+            raise ValueError(f"Unsupported recurrence rule part: {', '.join(sorted(unknown))}")
+
+        freq = parts.get("FREQ")
+        if freq not in ("DAILY", "WEEKLY"):
+            raise ValueError("FREQ must be DAILY or WEEKLY")
+
+        try:
+            interval = int(parts.get("INTERVAL", "1"))
+            count = int(parts["COUNT"]) if "COUNT" in parts else None
+            until = datetime.strptime(parts["UNTIL"][:8], "%Y%m%d").date() if "UNTIL" in parts else None
+        except ValueError:
+            raise ValueError("INTERVAL and COUNT must be numbers and UNTIL a YYYYMMDD date")
+        if interval < 1 or (count is not None and count < 1):
+            raise ValueError("INTERVAL and COUNT must be positive")
+        if count is None and until is None:
+            raise ValueError("A recurrence rule needs COUNT or UNTIL")
+
+        byday: Tuple[int, ...] = ()
+        if "BYDAY" in parts:
+            if freq != "WEEKLY":
+                raise ValueError("BYDAY is only supported with FREQ=WEEKLY")
+            try:
+                byday = tuple(sorted({WEEKDAYS.index(day) for day in parts["BYDAY"].split(",")}))
+            except ValueError:
+                raise ValueError("BYDAY takes MO, TU, WE, TH, FR, SA, SU")
+
+        return cls(freq, interval, byday, count, until)
+
+    def __str__(self) -> str:
+        parts = [f"FREQ={self.freq}"]
+        if self.interval != 1:
+            parts.append(f"INTERVAL={self.interval}")
+        if self.byday:
+            parts.append("BYDAY=" + ",".join(WEEKDAYS[day] for day in self.byday))
+        if self.count is not None:
+            parts.append(f"COUNT={self.count}")
+        if self.until is not None:
+            parts.append(f"UNTIL={self.until.strftime('%Y%m%d')}")
+        return ";".join(parts)
+
+    # Occurrences come in periods of `interval` days/weeks starting at `anchor`, each period
+    # holding the same day offsets
+    def _layout(self, dtstart: date) -> Tuple[date, int, Tuple[int, ...]]:
+        if self.freq == "DAILY":
+            return dtstart, self.interval, (0,)
+        return dtstart - timedelta(days=dtstart.weekday()), 7 * self.interval, self.byday or (dtstart.weekday(),)
+
+    # Occurrence dates within [start, end], in order. Jumps straight to the period containing
+    # `start`, so a window far into a long series costs no more than one near its beginning.
+    def between(self, dtstart: date, start: date, end: date) -> Iterator[date]:
+        anchor, period, offsets = self._layout(dtstart)
+        end = min(end, self.until) if self.until else end
+        # Offsets of the first period that fall before dtstart don't count towards COUNT
+        first_period = sum(1 for offset in offsets if anchor + timedelta(days=offset) >= dtstart)
+
+        p = max(0, (start - anchor).days // period) if start > anchor else 0
+        index = 0 if p == 0 else first_period + (p - 1) * len(offsets)
+        while True:
+            period_start = anchor + timedelta(days=p * period)
+            if period_start > end:
+                return
+            for offset in offsets:
+                day = period_start + timedelta(days=offset)
+                if day < dtstart:
+                    continue
+                if self.count is not None and index >= self.count:
+                    return
+                index += 1
+                if day > end:
+                    return
+                if day >= start:
+                    yield day
+            p += 1
+
+    # Every occurrence, as long as the series ends within RECURRENCE_MAX_DAYS of dtstart
+    def expand(self, dtstart: date) -> List[date]:
+        horizon = dtstart + timedelta(days=RECURRENCE_MAX_DAYS)
+        if next(self.between(dtstart, horizon + timedelta(days=1), date.max), None) is not None:
+            raise ValueError(f"A series may not run for more than {RECURRENCE_MAX_DAYS} days")
+        return list(self.between(dtstart, dtstart, horizon))
+
+
+@lru_cache(maxsize=1024)
+def parse_rule(text: str) -> RecurrenceRule:
+    return RecurrenceRule.parse(text)
+
+
+# ------------------- Occurrences -------------------
+class Occurrence(NamedTuple):
+    series_id: int
+    room_number: int
+    date: date
+    start_time: time
+    end_time: time
+
+    # Negative, so occurrences can share the occupancy index and history cursors with
+    # bookings without ever matching a booking id
+    @property
+    def id(self) -> int:
+        return -self.series_id
+
+
+SERIES_COLUMNS = (
+    BookingSeries.id, BookingSeries.room_number, BookingSeries.start_time, BookingSeries.end_time,
+    BookingSeries.rule, BookingSeries.first_date, BookingSeries.last_date
+)
+
+
+# Lazily, in date order; `series` is a row of SERIES_COLUMNS
+def occurrences_of(series, first: date, last: date) -> Iterator[Occurrence]:
+    series_id, room_number, start, end, rule, first_date, last_date = series
+    for day in parse_rule(rule).between(first_date, max(first, first_date), min(last, last_date)):
+        yield Occurrence(series_id, room_number, day, start, end)
+
+
+# Occurrences of every series matching `conditions`, expanded only inside [first, last]
+async def series_occurrences(db: AsyncSession, first: date, last: date, *conditions) -> List[Occurrence]:
+    result = await db.execute(
+        select(*SERIES_COLUMNS).where(BookingSeries.first_date <= last, BookingSeries.last_date >= first, *conditions)
+    )
+    return [occurrence for series in result for occurrence in occurrences_of(series, first, last)]
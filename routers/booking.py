@@ -1,44 +1,70 @@
 from fastapi import APIRouter, Request, Form, Depends, Query, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, date, time, timedelta
 from typing import Optional
+from urllib.parse import urlencode
 
 from database import get_db
-from models import Booking, User
+from models import Booking, BookingSeries, User
 from auth import get_current_user
-from schemas import UpdateBooking
+from schemas import BookingSeriesCreate, BulkBookingItem, BulkBookingRequest, UpdateBooking
+from occupancy import RoomOccupancy, Slot, occupancy_index
+from inventory import room_inventory
+from history import parse_history_filters, fetch_history_page, history_item, export_rows, export_csv, export_ndjson
+from recurrence import RecurrenceRule, parse_rule
+from templating import templates, template_variables
+import allocation
 
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
+
+
+async def render_book_page(request: Request, db: AsyncSession, day: date, message: str = ""):
+    room_map = RoomOccupancy(day)
+    if "room_map" in template_variables("book.html"):
+        await room_map.load(db)
+
+    return templates.TemplateResponse("book.html", {
+        "request": request,
+        "message": message,
+        "current_date": date.today().isoformat(),
+        "room_map": room_map
+    })
+
+
+# ✅ Point at the next slot of the same length that is free, so users don't have to guess
+async def no_room_message(db: AsyncSession, booking_date: date, start: time, end: time) -> str:
+    message = "No rooms available for the selected time."
+    duration = (datetime.combine(booking_date, end) - datetime.combine(booking_date, start)).seconds // 60
+    inventory = await room_inventory.load(db)
+    suggestions = await allocation.find_free_slots(
+        db, booking_date, booking_date + timedelta(days=6), duration, list(inventory.rooms),
+        limit=1, not_before=datetime.combine(booking_date, start)
+    )
+    if suggestions:
+        slot = suggestions[0]
+        message += f" Next free: Room {slot.room_number} on {slot.date.isoformat()} at {slot.start_time.strftime('%H:%M')}."
+    return message
 
 
 @router.get("/book", response_class=HTMLResponse)
-def book_form(
+async def book_form(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    today = date.today().isoformat()
-    bookings = db.query(Booking).join(User).all()
-    room_map = [(b.room_number, b.start_time, b.end_time, b.user.username) for b in bookings]
-    return templates.TemplateResponse("book.html", {
-        "request": request,
-        "room_map": room_map,
-        "message": "",
-        "current_date": today
-    })
+    return await render_book_page(request, db, date.today())
 
 @router.post("/book", response_class=HTMLResponse)
-def book_room(
+async def book_room(
     request: Request,
     name: str = Form(...),
     date_str: str = Form(...),
     start_time: str = Form(...),
     end_time: str = Form(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     today = date.today()
@@ -47,132 +73,221 @@ def book_room(
     end = time.fromisoformat(end_time)
     booking_start_datetime = datetime.combine(booking_date, start)
 
-    bookings = db.query(Booking).join(User).all()
-    room_map = [(b.room_number, b.start_time, b.end_time, b.user.username) for b in bookings]
-
     if booking_date < today:
-        return templates.TemplateResponse("book.html", {
-            "request": request,
-            "message": "You cannot book a room for a past date.",
-            "current_date": today.isoformat(),
-            "room_map": room_map
-        })
+        return await render_book_page(request, db, booking_date, "You cannot book a room for a past date.")
 
     if booking_start_datetime <= datetime.now() + timedelta(minutes=1):
-        return templates.TemplateResponse("book.html", {
-            "request": request,
-            "message": "Cannot book for a past date/time.",
-            "current_date": today.isoformat(),
-            "room_map": room_map
-        })
+        return await render_book_page(request, db, booking_date, "Cannot book for a past date/time.")
 
     if end <= start:
-        return templates.TemplateResponse("book.html", {
-            "request": request,
-            "message": "End time must be after start time.",
-            "current_date": today.isoformat(),
-            "room_map": room_map
-        })
+        return await render_book_page(request, db, booking_date, "End time must be after start time.")
+
+    def add_booking(room_number: int) -> Booking:
+        new_booking = Booking(
+            name=name,
+            user_id=current_user.id,  # ✅ use JWT-authenticated user
+            room_number=room_number,
+            date=booking_date,
+            start_time=start,
+            end_time=end
+        )
+        db.add(new_booking)
+        return new_booking
+
+    # ✅ Re-checked and committed under a per-(date, room) lock, so concurrent requests can't double book
+    try:
+        available_room = await allocation.reserve_room(db, booking_date, start, end, add_booking)
+    except allocation.RoomUnavailable:
+        return await render_book_page(request, db, booking_date, await no_room_message(db, booking_date, start, end))
+
+    return await render_book_page(request, db, booking_date, f"✅ Room {available_room} successfully booked!")
+
+def parse_bulk_item(index: int, entry: BulkBookingItem, room_numbers, now: datetime) -> allocation.BulkItem:
+    item = allocation.BulkItem(index=index, name=entry.name, room_number=entry.room)
+    try:
+        item.date = date.fromisoformat(entry.date)
+        item.start = time.fromisoformat(entry.start_time)
+        item.end = time.fromisoformat(entry.end_time)
+    except ValueError:
+        item.status, item.error = "invalid", "Invalid date or time format"
+        return item
+
+    # ✅ Same rules as POST /book
+    if item.date < now.date():
+        item.error = "You cannot book a room for a past date."
+    elif datetime.combine(item.date, item.start) <= now + timedelta(minutes=1):
+        item.error = "Cannot book for a past date/time."
+    elif item.end <= item.start:
+        item.error = "End time must be after start time."
+    elif item.room_number is not None and item.room_number not in room_numbers:
+        item.error = f"Room {item.room_number} does not exist"
+    if item.error:
+        item.status = "invalid"
+    return item
+
+
+def bulk_result(item: allocation.BulkItem) -> dict:
+    return {
+        "index": item.index,
+        "status": item.status,
+        "booking_id": item.booking_id,
+        "room_number": item.room_number if item.status == "booked" else None,
+        "date": item.date.isoformat() if item.date else None,
+        "start_time": item.start.isoformat(timespec="minutes") if item.start else None,
+        "end_time": item.end.isoformat(timespec="minutes") if item.end else None,
+        "error": item.error
+    }
 
-    available_room = None
-    for room_number in range(1, 11):
-        conflict = db.query(Booking).filter(
-            Booking.date == booking_date,
-            Booking.room_number == room_number,
-            Booking.start_time < end,
-            Booking.end_time > start
-        ).first()
-        if not conflict:
-            available_room = room_number
-            break
-
-    if not available_room:
-        return templates.TemplateResponse("book.html", {
-            "request": request,
-            "message": "No rooms available for the selected time.",
-            "current_date": today.isoformat(),
-            "room_map": room_map
-        })
 
-    new_booking = Booking(
-        name=name,
-        user_id=current_user.id,  # ✅ use JWT-authenticated user
-        room_number=available_room,
-        date=booking_date,
+# Many bookings in one request. "atomic" books all of them or none; "best_effort" books
+# whatever fits. Either way every item gets its own result, in request order.
+@router.post("/bookings/bulk")
+async def bulk_book(
+    payload: BulkBookingRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if not payload.bookings:
+        raise HTTPException(status_code=400, detail="No bookings given")
+    if len(payload.bookings) > allocation.BULK_BOOKING_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {allocation.BULK_BOOKING_MAX_ITEMS} bookings per request")
+
+    inventory = await room_inventory.load(db)
+    now = datetime.now()
+    items = [parse_bulk_item(i, entry, inventory.numbers, now) for i, entry in enumerate(payload.bookings)]
+    atomic = payload.mode == "atomic"
+
+    status_code = 200
+    if atomic and any(item.status == "invalid" for item in items):
+        for item in items:
+            if item.status == "pending":
+                item.status, item.error = "skipped", "Not booked: another booking in the batch failed."
+        status_code = 422
+    else:
+        try:
+            await allocation.reserve_many(db, current_user.id, items, atomic)
+        except allocation.RoomUnavailable:
+            raise HTTPException(status_code=409, detail="Bookings changed while saving, please retry")
+        if atomic and any(item.status != "booked" for item in items):
+            status_code = 409
+
+    return JSONResponse(status_code=status_code, content={
+        "mode": payload.mode,
+        "booked": sum(item.status == "booked" for item in items),
+        "results": [bulk_result(item) for item in items]
+    })
+
+# "Room X every Monday 10:00-11:00 until April" as one row; occurrences are never stored
+@router.post("/booking-series")
+async def create_booking_series(
+    details: BookingSeriesCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        first_date = date.fromisoformat(details.start_date)
+        start = time.fromisoformat(details.start_time)
+        end = time.fromisoformat(details.end_time)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date or time format")
+
+    if end <= start:
+        raise HTTPException(status_code=400, detail="End time must be after start time.")
+
+    try:
+        rule = RecurrenceRule.parse(details.rule)
+        dates = rule.expand(first_date)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    if not dates:
+        raise HTTPException(status_code=400, detail="The recurrence rule has no occurrences")
+
+    if datetime.combine(dates[0], start) <= datetime.now() + timedelta(minutes=1):
+        raise HTTPException(status_code=400, detail="Cannot book for a past date/time.")
+
+    inventory = await room_inventory.load(db)
+    if details.room not in inventory.numbers:
+        raise HTTPException(status_code=400, detail=f"Room {details.room} does not exist")
+
+    series = BookingSeries(
+        user_id=current_user.id,
+        name=details.name,
+        room_number=details.room,
         start_time=start,
-        end_time=end
+        end_time=end,
+        rule=str(rule),
+        first_date=first_date,
+        last_date=dates[-1]
     )
-    db.add(new_booking)
-    db.commit()
 
-    bookings = db.query(Booking).join(User).all()
-    room_map = [(b.room_number, b.start_time, b.end_time, b.user.username) for b in bookings]
+    # ✅ Every occurrence checked in one go, under the same per-(date, room) locks as /book
+    clashes = await allocation.reserve_series(db, series, dates)
+    if clashes:
+        return JSONResponse(status_code=409, content={
+            "detail": f"Room {details.room} is already booked on {len(clashes)} of these dates",
+            "conflicts": [d.isoformat() for d in clashes]
+        })
 
-    return templates.TemplateResponse("book.html", {
-        "request": request,
-        "message": f"✅ Room {available_room} successfully booked!",
-        "current_date": today.isoformat(),
-        "room_map": room_map
-    })
+    return {
+        "message": "Series booked successfully",
+        "series": {
+            "id": series.id,
+            "room_number": series.room_number,
+            "rule": series.rule,
+            "first_date": dates[0],
+            "last_date": dates[-1],
+            "start_time": start,
+            "end_time": end,
+            "occurrences": len(dates)
+        }
+    }
+
+@router.delete("/booking-series/{series_id}")
+async def delete_booking_series(series_id: int, db: AsyncSession = Depends(get_db), user: User = Depends(get_current_user)):
+    result = await db.execute(
+        select(BookingSeries).where(BookingSeries.id == series_id, BookingSeries.user_id == user.id)
+    )
+    series = result.scalars().first()
+    if not series:
+        raise HTTPException(status_code=404, detail="Series not found or unauthorized")
+
+    old_slots = [
+        Slot(-series.id, series.room_number, d, series.start_time, series.end_time)
+        for d in parse_rule(series.rule).between(series.first_date, series.first_date, series.last_date)
+    ]
+    await db.delete(series)
+    await db.commit()
+    await occupancy_index.bookings_changed((slot, None) for slot in old_slots)
+    return {"message": "Series deleted successfully"}
 
 @router.get("/history")
-def booking_history(
+async def booking_history(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
     date: Optional[str] = Query(None),
     start_time: Optional[str] = Query(None),
-    end_time: Optional[str] = Query(None)
+    end_time: Optional[str] = Query(None),
+    after: Optional[str] = Query(None),
+    before: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None)
 ):
-    # Check for warning: if time is given without date
-    warning_message = None
-    if (start_time or end_time) and not date:
-        warning_message = "Please select a date when filtering by time."
-
-    # Base query
-    query = db.query(Booking).filter(Booking.user_id == current_user.id)
-
-    # Apply filters only if there's no warning
-    if not warning_message:
-        if date:
-            try:
-                filter_date = datetime.strptime(date, "%Y-%m-%d").date()
-                query = query.filter(Booking.date == filter_date)
-            except ValueError:
-                warning_message = "Invalid date format."
-
-        if date and start_time:
-            try:
-                filter_start = datetime.strptime(start_time, "%H:%M").time()
-                query = query.filter(Booking.start_time >= filter_start)
-            except ValueError:
-                warning_message = "Invalid start time format."
-
-        if date and end_time:
-            try:
-                filter_end = datetime.strptime(end_time, "%H:%M").time()
-                query = query.filter(Booking.end_time <= filter_end)
-            except ValueError:
-                warning_message = "Invalid end time format."
+    filters, warning_message = parse_history_filters(date, start_time, end_time)
 
-    bookings = query.order_by(Booking.date.desc(), Booking.start_time.desc()).all()
+    try:
+        page = await fetch_history_page(db, current_user.id, filters, after, before, limit)
+    except ValueError as exc:
+        warning_message = str(exc)
+        page = await fetch_history_page(db, current_user.id, filters, limit=limit)
 
     # Mark expired bookings
     now = datetime.now()
-    today_str = datetime.today().date().strftime("%Y-%m-%d")  # Current date for template
-    booking_list = []
-    for booking in bookings:
-        booking_datetime = datetime.combine(booking.date, booking.end_time)
+    today_str = now.date().isoformat()  # Current date for template
+    booking_list = [history_item(row, now) for row in page.rows]
 
-        booking_list.append({
-            "id": booking.id,
-            "room_number": booking.room_number,
-            "date": booking.date.strftime("%Y-%m-%d"),
-            "start_time": booking.start_time.strftime("%H:%M"),
-            "end_time": booking.end_time.strftime("%H:%M"),
-            "is_expired": now >= booking_datetime,
-            "can_edit": now < booking_datetime
-        })
+    # Filters carried over into the next/prev page links
+    filters = {k: v for k, v in {"date": date, "start_time": start_time, "end_time": end_time, "limit": limit}.items() if v}
 
     # Render template
     return templates.TemplateResponse(
@@ -184,13 +299,68 @@ def booking_history(
             "date": date,
             "start_time": start_time,
             "end_time": end_time,
-            "current_date": today_str  # pass today to template
+            "current_date": today_str,  # pass today to template
+            "next_url": f"/history?{urlencode({**filters, 'after': page.next_cursor})}" if page.next_cursor else None,
+            "prev_url": f"/history?{urlencode({**filters, 'before': page.prev_cursor})}" if page.prev_cursor else None
         }
     )
 
+# JSON variant of /history for infinite scroll
+@router.get("/history/items")
+async def booking_history_items(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    date: Optional[str] = Query(None),
+    start_time: Optional[str] = Query(None),
+    end_time: Optional[str] = Query(None),
+    after: Optional[str] = Query(None),
+    before: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None)
+):
+    filters, warning_message = parse_history_filters(date, start_time, end_time)
+
+    try:
+        page = await fetch_history_page(db, current_user.id, filters, after, before, limit)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    now = datetime.now()
+    return {
+        "bookings": [history_item(row, now) for row in page.rows],
+        "next_cursor": page.next_cursor,
+        "prev_cursor": page.prev_cursor,
+        "warning_message": warning_message
+    }
+
+# All of the user's bookings (and series occurrences) matching the /history filters,
+# streamed as CSV or NDJSON, oldest first
+@router.get("/history/export")
+async def booking_history_export(
+    current_user: User = Depends(get_current_user),
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    date: Optional[str] = Query(None),
+    start_time: Optional[str] = Query(None),
+    end_time: Optional[str] = Query(None)
+):
+    filters, warning_message = parse_history_filters(date, start_time, end_time)
+    # An export quietly ignoring a mistyped filter would be worse than no export
+    if warning_message:
+        raise HTTPException(status_code=400, detail=warning_message)
+
+    rows = export_rows(current_user.id, filters)
+    filename = f"bookings-{datetime.now():%Y-%m-%d}.{format}"
+    if format == "csv":
+        body, media_type = export_csv(rows), "text/csv"
+    else:
+        body, media_type = export_ndjson(rows), "application/x-ndjson"
+
+    return StreamingResponse(body, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="{filename}"'
+    })
+
 @router.get("/edit_booking/{booking_id}")
-def edit_booking_form(booking_id: int, request: Request, db: Session = Depends(get_db)):
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
+async def edit_booking_form(booking_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    booking = await db.get(Booking, booking_id)
     if not booking:
         return RedirectResponse(url="/history")
     
@@ -204,16 +374,19 @@ def edit_booking_form(booking_id: int, request: Request, db: Session = Depends(g
     })
 
 @router.post("/edit_booking/{booking_id}")
-def edit_booking_submit(
+async def edit_booking_submit(
     booking_id: int,
     request: Request,
     new_date: str = Form(...),
     new_start: str = Form(...),
     new_end: str = Form(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)  # ✅ Ensure user is authenticated
 ):
-    booking = db.query(Booking).filter(Booking.id == booking_id, Booking.user_id == current_user.id).first()
+    result = await db.execute(
+        select(Booking).where(Booking.id == booking_id, Booking.user_id == current_user.id)
+    )
+    booking = result.scalars().first()
     if not booking:
         return RedirectResponse(url="/history")
 
@@ -249,47 +422,46 @@ def edit_booking_submit(
             "error": "End time must be after start time."
         })
 
-    # ✅ Find an available room (same logic as /book)
-    available_room = None
-    for room_number in range(1, 11):
-        conflict = db.query(Booking).filter(
-            Booking.date == new_date_obj,
-            Booking.room_number == room_number,
-            Booking.id != booking.id,  # exclude current booking
-            Booking.start_time < new_end_obj,
-            Booking.end_time > new_start_obj
-        ).first()
-        if not conflict:
-            available_room = room_number
-            break
-
-    if not available_room:
+    old_slot = Slot.of(booking)
+
+    # ✅ Update booking details
+    def move_booking(room_number: int) -> Booking:
+        booking.date = new_date_obj
+        booking.start_time = new_start_obj
+        booking.end_time = new_end_obj
+        booking.room_number = room_number
+        return booking
+
+    # ✅ Find an available room (same logic as /book), excluding the current booking
+    try:
+        await allocation.reserve_room(
+            db, new_date_obj, new_start_obj, new_end_obj, move_booking,
+            exclude_booking_id=booking_id, old=old_slot
+        )
+    except allocation.RoomUnavailable:
+        await db.refresh(booking)
         return templates.TemplateResponse("edit_booking.html", {
             "request": request,
             "booking": booking,
             "error": "❌ No rooms available for the selected time."
         })
 
-    # ✅ Update booking details
-    booking.date = new_date_obj
-    booking.start_time = new_start_obj
-    booking.end_time = new_end_obj
-    booking.room_number = available_room
-    db.commit()
-
     return RedirectResponse(url="/history", status_code=303)
 
 @router.put("/update-booking/{booking_id}")
 async def update_booking(
     booking_id: int,
     details: UpdateBooking,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user: dict = Depends(get_current_user)
 ):
-    booking = db.query(Booking).filter(
-        Booking.id == booking_id,
-        Booking.user_id == user.id
-    ).first()
+    result = await db.execute(
+        select(Booking).where(
+            Booking.id == booking_id,
+            Booking.user_id == user.id
+        )
+    )
+    booking = result.scalars().first()
 
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
@@ -303,6 +475,10 @@ async def update_booking(
     if not new_room:
         raise HTTPException(status_code=400, detail="Room selection is required")
 
+    inventory = await room_inventory.load(db)
+    if new_room not in inventory.numbers:
+        raise HTTPException(status_code=400, detail=f"Room {new_room} does not exist")
+
     def parse_date(value) -> date:
         if isinstance(value, date):
             return value
@@ -337,25 +513,26 @@ async def update_booking(
     if selected_date < now.date() or (selected_date == now.date() and start_time_obj <= now.time()):
         raise HTTPException(status_code=400, detail="Cannot update booking to a past time")
 
-    # ✅ Conflict check for selected room
-    conflict = db.query(Booking).filter(
-        Booking.room_number == new_room,
-        Booking.date == new_date,
-        Booking.id != booking_id,
-        (Booking.start_time < new_end) & (Booking.end_time > new_start)
-    ).first()
-
-    if conflict:
-        raise HTTPException(status_code=400, detail=f"Room {new_room} is already booked for this time")
+    old_slot = Slot.of(booking)
 
     # ✅ Update booking
-    booking.date = new_date
-    booking.start_time = new_start
-    booking.end_time = new_end
-    booking.room_number = new_room
+    def move_booking(room_number: int) -> Booking:
+        booking.date = selected_date
+        booking.start_time = start_time_obj
+        booking.end_time = end_time_obj
+        booking.room_number = room_number
+        return booking
+
+    # ✅ Conflict check for selected room, under the same per-(date, room) lock as /book
+    try:
+        await allocation.reserve_room(
+            db, selected_date, start_time_obj, end_time_obj, move_booking,
+            exclude_booking_id=booking_id, room_number=new_room, old=old_slot
+        )
+    except allocation.RoomUnavailable:
+        raise HTTPException(status_code=400, detail=f"Room {new_room} is already booked for this time")
 
-    db.commit()
-    db.refresh(booking)
+    await db.refresh(booking)
 
     return {
         "message": "Booking updated successfully",
@@ -370,7 +547,7 @@ async def update_booking(
 
 
 @router.post("/available-rooms/{booking_id}")
-async def available_rooms(booking_id: int, details: UpdateBooking, db: Session = Depends(get_db)):
+async def available_rooms(booking_id: int, details: UpdateBooking, db: AsyncSession = Depends(get_db)):
     # --- helpers that accept multiple formats ---
     def parse_date(value) -> date:
         if isinstance(value, date):
@@ -401,36 +578,25 @@ async def available_rooms(booking_id: int, details: UpdateBooking, db: Session =
     if start >= end:
         raise HTTPException(status_code=400, detail="End time must be after start time")
 
-    # Find booked rooms for that time slot (excluding current booking)
-    booked_rooms = (
-        db.query(Booking.room_number)
-        .filter(
-            Booking.date == date_str,
-            Booking.id != booking_id,
-            Booking.start_time < end,
-            Booking.end_time > start,
-        )
-        .all()
-    )
-    booked_rooms = [r[0] for r in booked_rooms]
-
-    # Fetch all rooms and exclude booked ones
-    all_rooms = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]  # replace with DB query if needed
-    available_rooms = [r for r in all_rooms if r not in booked_rooms]
+    # Free rooms for that time slot (excluding current booking)
+    rooms = await allocation.available_rooms(db, date_str, start, end, exclude_booking_id=booking_id)
 
-    return {"available_rooms": available_rooms}
+    return {"available_rooms": rooms}
 
 
 @router.delete("/delete-booking/{booking_id}")
-async def delete_booking(booking_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+async def delete_booking(booking_id: int, db: AsyncSession = Depends(get_db), user: User = Depends(get_current_user)):
     if user is None:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    booking = db.query(Booking).filter(Booking.id == booking_id, Booking.user_id == user.id).first()
+    result = await db.execute(select(Booking).where(Booking.id == booking_id, Booking.user_id == user.id))
+    booking = result.scalars().first()
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found or unauthorized")
 
-    db.delete(booking)
-    db.commit()
+    old_slot = Slot.of(booking)
+    await db.delete(booking)
+    await db.commit()
+    await occupancy_index.booking_changed(old_slot, None)
     return {"message": "Booking deleted successfully"}
 
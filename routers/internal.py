@@ -0,0 +1,26 @@
+from fastapi import APIRouter
+
+from auth import password_hasher
+from database import pool_stats
+from live import availability_feed
+
+
+router = APIRouter(prefix="/internal", include_in_schema=False)
+
+
+# Pool health for this worker process (each uvicorn worker has its own pool)
+@router.get("/db-pool")
+async def db_pool():
+    return pool_stats()
+
+
+# bcrypt worker pool queue depth and rejections for this worker process
+@router.get("/password-hasher")
+async def password_hasher_stats():
+    return password_hasher.stats()
+
+
+# Open /rooms/live subscriptions on this worker process
+@router.get("/live-feed")
+async def live_feed_stats():
+    return {"subscribers": availability_feed.subscribers, "max_subscribers": availability_feed.max_subscribers}
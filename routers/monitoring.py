@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Response
+
+from metrics import CONTENT_TYPE_LATEST, render_metrics
+
+
+router = APIRouter(include_in_schema=False)
+
+
+# Prometheus scrape target; covers every worker when PROMETHEUS_MULTIPROC_DIR is set
+@router.get("/metrics")
+async def metrics():
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,144 @@
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, time, timedelta
+from typing import List, Optional
+
+from database import get_db
+from occupancy import OCCUPANCY_INDEX_TTL
+from inventory import room_inventory
+from models import User
+from auth import get_current_user
+from cache import etag_matches
+from live import availability_feed
+import allocation
+
+
+router = APIRouter(prefix="/rooms")
+
+# How long browsers/proxies may reuse an availability answer without revalidating it; capped at
+# the occupancy index TTL, the longest an answer may go unchecked against the database
+AVAILABILITY_MAX_AGE = min(int(os.getenv("AVAILABILITY_MAX_AGE", "0")), int(OCCUPANCY_INDEX_TTL))
+
+
+# ✅ Cacheable read-only twin of POST /available-rooms/{id}. A repeat with If-None-Match gets a
+# 304 straight from the in-memory version counter, without touching the database.
+# Across several workers this needs NOTIFY_BACKEND=postgres (see allocation.availability_etag).
+@router.get("/availability")
+async def room_availability(
+    request: Request,
+    date_str: str = Query(..., alias="date"),
+    start: str = Query(...),
+    end: str = Query(...),
+    exclude: Optional[int] = Query(None),
+    db: AsyncSession = Depends(get_db)
+):
+    try:
+        day = date.fromisoformat(date_str)
+        start_time = time.fromisoformat(start)
+        end_time = time.fromisoformat(end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date or time format")
+
+    if start_time >= end_time:
+        raise HTTPException(status_code=400, detail="End time must be after start time")
+
+    # Read before the rooms are computed, so a change in between can only make the tag too old
+    etag = allocation.availability_etag(day)
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={AVAILABILITY_MAX_AGE}, must-revalidate"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    rooms = await allocation.available_rooms(db, day, start_time, end_time, exclude_booking_id=exclude)
+    return JSONResponse({"available_rooms": rooms}, headers=headers)
+
+
+
+# ✅ The whole day as one room x 15-minute-slot grid, instead of one availability call per slot
+@router.get("/grid")
+async def room_grid(
+    request: Request,
+    date_str: str = Query(..., alias="date"),
+    db: AsyncSession = Depends(get_db)
+):
+    try:
+        day = date.fromisoformat(date_str)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format")
+
+    etag = allocation.availability_etag(day)
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={AVAILABILITY_MAX_AGE}, must-revalidate"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    return JSONResponse(await allocation.occupancy_grid(db, day), headers=headers)
+
+
+# ✅ "When is a room free for an hour?" in one request instead of trying slot after slot on /book
+@router.get("/free-slots")
+async def free_slots(
+    duration: int = Query(..., ge=allocation.FREE_SLOT_STEP, le=24 * 60, description="minutes"),
+    from_str: Optional[str] = Query(None, alias="from"),
+    to_str: Optional[str] = Query(None, alias="to"),
+    earliest: Optional[str] = Query(None),
+    latest: Optional[str] = Query(None),
+    room: Optional[List[int]] = Query(None),
+    min_capacity: int = Query(0, ge=0),
+    feature: Optional[List[str]] = Query(None),
+    limit: int = Query(5, ge=1, le=50),
+    db: AsyncSession = Depends(get_db)
+):
+    try:
+        first = date.fromisoformat(from_str) if from_str else date.today()
+        last = date.fromisoformat(to_str) if to_str else first + timedelta(days=6)
+        earliest_time = time.fromisoformat(earliest) if earliest else allocation.FREE_SLOT_DAY_START
+        latest_time = time.fromisoformat(latest) if latest else allocation.FREE_SLOT_DAY_END
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date or time format")
+
+    if last < first:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (last - first).days >= allocation.FREE_SLOT_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Search at most {allocation.FREE_SLOT_MAX_DAYS} days at once")
+    if latest_time <= earliest_time:
+        raise HTTPException(status_code=400, detail="'latest' must be after 'earliest'")
+
+    inventory = await room_inventory.load(db)
+    rooms = inventory.matching(set(room) if room else None, min_capacity, tuple(feature or ()))
+    slots = await allocation.find_free_slots(
+        db, first, last, duration, rooms, earliest=earliest_time, latest=latest_time, limit=limit
+    )
+
+    return {
+        "duration": duration,
+        "slots": [
+            {
+                "room_number": slot.room_number,
+                "date": slot.date.isoformat(),
+                "start_time": slot.start_time.isoformat(timespec="minutes"),
+                "end_time": slot.end_time.isoformat(timespec="minutes")
+            }
+            for slot in slots
+        ]
+    }
+
+
+# ✅ Server-Sent Events: the date's room occupancy now, then again after every booking change on it
+@router.get("/live")
+async def live_availability(
+    date_str: str = Query(..., alias="date"),
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        day = date.fromisoformat(date_str)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format")
+
+    if availability_feed.full:
+        raise HTTPException(status_code=503, detail="Too many live subscribers", headers={"Retry-After": "30"})
+
+    return StreamingResponse(availability_feed.stream(day), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # don't let nginx buffer the stream
+    })
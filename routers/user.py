@@ -1,78 +1,62 @@
 from fastapi import APIRouter, Request, Form, Depends, status
 from fastapi.responses import RedirectResponse, HTMLResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import EmailStr
 from models import User
 from database import get_db
-from auth import hash_password, verify_password, create_access_token, decode_access_token
+from auth import hash_password_async, verify_password_async, create_access_token, decode_access_token, invalidate_user
 from datetime import timedelta
-from dotenv import load_dotenv
-import os
 from schemas import EmailRequest
+from mailer import enqueue_email
+from templating import page_cache, templates
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
-
-load_dotenv("/etc/secrets/.env") if os.path.exists("/etc/secrets/.env") else load_dotenv()
-
-# Configure FastAPI-Mail
-conf = ConnectionConfig(
-    MAIL_USERNAME=os.getenv("MAIL_USERNAME"),
-    MAIL_PASSWORD=os.getenv("MAIL_PASSWORD"),
-    MAIL_FROM=os.getenv("MAIL_FROM"),
-    MAIL_FROM_NAME=os.getenv("MAIL_FROM_NAME", "Room Booking App"),
-    MAIL_PORT=int(os.getenv("MAIL_PORT", 587)),
-    MAIL_SERVER=os.getenv("MAIL_SERVER", "smtp.gmail.com"),
-    MAIL_STARTTLS=os.getenv("MAIL_STARTTLS", "True").lower() == "true",
-    MAIL_SSL_TLS=os.getenv("MAIL_SSL_TLS", "False").lower() == "true",
-    USE_CREDENTIALS=os.getenv("USE_CREDENTIALS", "True").lower() == "true",
-    VALIDATE_CERTS=os.getenv("VALIDATE_CERTS", "True").lower() == "true"
-)
 
 # ------------------- Register -------------------
 @router.get("/register")
 def register_get(request: Request):
-    return templates.TemplateResponse("register.html", {"request": request})
+    return page_cache.response(request, "register.html")
 
 @router.post("/register")
-def register_post(
+async def register_post(
     request: Request,
     username: str = Form(...),
     email: EmailStr = Form(...),
     password: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     if not email.endswith("@gmail.com"):
         return templates.TemplateResponse("register.html", {"request": request, "msg": "Email must end with @gmail.com"})
 
-    if db.query(User).filter((User.username == username) | (User.email == email)).first():
+    result = await db.execute(select(User).where((User.username == username) | (User.email == email)))
+    if result.scalars().first():
         return templates.TemplateResponse("register.html", {"request": request, "msg": "Username or email already exists"})
 
     user = User(
         username=username,
         email=email,
-        password=hash_password(password)
+        password=await hash_password_async(password)
     )
     db.add(user)
-    db.commit()
+    await db.commit()
     return RedirectResponse("/login", status_code=status.HTTP_302_FOUND)
 
 # ------------------- Login -------------------
 @router.get("/login")
 def login_get(request: Request):
-    return templates.TemplateResponse("login.html", {"request": request})
+    return page_cache.response(request, "login.html")
 
 @router.post("/login")
-def login_post(
+async def login_post(
     request: Request,
     username: str = Form(...),
     password: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = db.query(User).filter(User.username == username).first()
-    if not user or not verify_password(password, user.password):
+    result = await db.execute(select(User).where(User.username == username))
+    user = result.scalars().first()
+    if not user or not await verify_password_async(password, user.password):
         return templates.TemplateResponse("login.html", {"request": request, "msg": "Invalid username or password"})
 
     token = create_access_token({"sub": user.username})
@@ -90,19 +74,20 @@ def logout(request: Request):
 # ------------------- Forgot Password / Username -------------------
 @router.get("/forgot", response_class=HTMLResponse)
 def forgot_get(request: Request):
-    return templates.TemplateResponse("forgot.html", {"request": request})
+    return page_cache.response(request, "forgot.html")
 
 @router.post("/forgot", response_class=HTMLResponse)
 async def forgot_post(
     request: Request,
     email: EmailStr = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # # ✅ Check if email ends with @gmail.com
     # if not email.endswith("@gmail.com"):
     #     return templates.TemplateResponse("forgot.html", {"request": request, "msg": "Email must end with @gmail.com"})
     
-    user = db.query(User).filter(User.email == email).first()
+    result = await db.execute(select(User).where(User.email == email))
+    user = result.scalars().first()
     if not user:
         return templates.TemplateResponse("forgot.html", {"request": request, "msg": "Please enter your correct registered Email"})
 
@@ -125,15 +110,8 @@ This link will expire in 15 minutes.
 If you didn't request this, just ignore this email.
 """
 
-    message = MessageSchema(
-        subject="🔐 Your Account Recovery Details",
-        recipients=[email],
-        body=body,
-        subtype="plain"
-    )
-
-    fm = FastMail(conf)
-    await fm.send_message(message)
+    # Queued for the outbox worker, so the response doesn't wait on SMTP
+    await enqueue_email(db, email, "🔐 Your Account Recovery Details", body)
 
     return templates.TemplateResponse("forgot.html", {"request": request, "msg": "📧 Username and reset link sent to your email!"})
 
@@ -150,11 +128,11 @@ def reset_password_form(request: Request, token: str):
     return templates.TemplateResponse("reset_password.html", {"request": request, "token": token})
 
 @router.post("/reset-password")
-def reset_password_submit(
+async def reset_password_submit(
     request: Request,
     token: str = Form(...),
     new_password: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     payload, error = decode_access_token(token)
 
@@ -172,7 +150,8 @@ def reset_password_submit(
         })
 
     username = payload.get("sub")
-    user = db.query(User).filter(User.username == username).first()
+    result = await db.execute(select(User).where(User.username == username))
+    user = result.scalars().first()
     if not user:
         return templates.TemplateResponse("reset_password.html", {
             "request": request,
@@ -180,6 +159,7 @@ def reset_password_submit(
             "msg": "User not found"
         })
 
-    user.password = hash_password(new_password)
-    db.commit()
+    user.password = await hash_password_async(new_password)
+    await db.commit()
+    await invalidate_user(user.username)
     return RedirectResponse("/login", status_code=status.HTTP_302_FOUND)
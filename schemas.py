@@ -1,3 +1,5 @@
+from typing import List, Literal
+
 from pydantic import BaseModel, EmailStr
 
 class UserCreate(BaseModel):
@@ -29,3 +31,21 @@ class UpdateBooking(BaseModel):
     new_start: str
     new_end: str
     room: int | None = None
+
+# ✅ For POST /bookings/bulk
+class BulkBookingItem(BookingCreate):
+    name: str
+    room: int | None = None
+
+class BulkBookingRequest(BaseModel):
+    mode: Literal["atomic", "best_effort"] = "atomic"
+    bookings: List[BulkBookingItem]
+
+# ✅ For POST /booking-series; rule is an RRULE such as "FREQ=WEEKLY;BYDAY=MO;UNTIL=20270419"
+class BookingSeriesCreate(BaseModel):
+    name: str
+    room: int
+    start_date: str
+    start_time: str
+    end_time: str
+    rule: str
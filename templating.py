@@ -0,0 +1,120 @@
+import hashlib
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template, meta
+
+from assets import static_url
+from cache import etag_matches
+from compression import compress, negotiate
+from metrics import TEMPLATE_RENDER_LATENCY
+
+
+TEMPLATES_DIR = "templates"
+
+# Compiled template bytecode survives restarts, so a fresh worker skips the Jinja compile step
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "room-booking-jinja"))
+# Re-check template files on every render; only useful while editing templates locally
+TEMPLATES_AUTO_RELOAD = os.getenv("TEMPLATES_AUTO_RELOAD", "False").lower() == "true"
+
+os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+
+
+# Records render time per template (TemplateResponse renders through Template.render)
+class TimedTemplate(Template):
+    def render(self, *args, **kwargs) -> str:
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            TEMPLATE_RENDER_LATENCY.labels(self.name).observe(time.perf_counter() - started)
+
+
+env = Environment(
+    loader=FileSystemLoader(TEMPLATES_DIR),
+    autoescape=True,
+    auto_reload=TEMPLATES_AUTO_RELOAD,
+    bytecode_cache=FileSystemBytecodeCache(TEMPLATE_CACHE_DIR),
+    cache_size=-1  # never evict compiled templates
+)
+env.template_class = TimedTemplate
+env.globals["static_url"] = static_url
+
+# One environment shared by main.py and every router
+templates = Jinja2Templates(env=env)
+
+
+# Load every template once at startup so the first request after a deploy isn't paying for it
+def precompile_templates() -> int:
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+# Names a template reads from its context, so optional data is only loaded when rendered
+@lru_cache
+def template_variables(name: str) -> frozenset:
+    source, _, _ = env.loader.get_source(env, name)
+    return frozenset(meta.find_undeclared_variables(env.parse(source)))
+
+
+# ------------------- Rendered pages -------------------
+# Pages whose HTML doesn't depend on the request (landing and auth forms) are rendered once per
+# worker and kept with their compressed variants, so a hit is a dict lookup: no Jinja, no gzip.
+# A page is re-rendered when its template is reloaded (TEMPLATES_AUTO_RELOAD); otherwise
+# templates only change with a deploy, which starts fresh workers.
+@dataclass
+class RenderedPage:
+    template: Template
+    etag: str
+    body: bytes
+    variants: Dict[str, bytes]  # Content-Encoding -> body, best first
+
+
+class PageCache:
+    def __init__(self):
+        self._pages: Dict[str, RenderedPage] = {}
+
+    def page(self, name: str) -> RenderedPage:
+        page = self._pages.get(name)
+        if page is None or (TEMPLATES_AUTO_RELOAD and env.get_template(name) is not page.template):
+            page = self._pages[name] = self._render(name)
+        return page
+
+    def _render(self, name: str) -> RenderedPage:
+        if "request" in template_variables(name):
+            raise ValueError(f"{name} reads the request and can't be cached")
+        template = env.get_template(name)
+        body = template.render().encode()
+        return RenderedPage(
+            template=template,
+            etag=f'"{hashlib.sha256(body).hexdigest()[:20]}"',
+            body=body,
+            variants=compress(body)
+        )
+
+    def response(self, request: Request, name: str) -> Response:
+        page = self.page(name)
+        encoding: Optional[str] = negotiate(request.headers.get("accept-encoding"), page.variants)
+        # Each encoding is its own representation, with its own strong ETag
+        etag = page.etag if encoding is None else f'{page.etag[:-1]}-{encoding}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+            return Response(page.variants[encoding], media_type="text/html", headers=headers)
+        return Response(page.body, media_type="text/html", headers=headers)
+
+    def clear(self) -> None:
+        self._pages.clear()
+
+
+page_cache = PageCache()
@@ -0,0 +1,68 @@
+from datetime import date, time
+
+from occupancy import DayOccupancy, OccupancyIndex, Slot
+
+DAY = date(2030, 1, 7)
+
+
+def test_add_is_idempotent():
+    occupancy = DayOccupancy()
+    occupancy.add(1, 1, time(9), time(10))
+    occupancy.add(1, 1, time(9), time(10))
+    assert occupancy.rooms[1] == [(time(9), time(10), 1)]
+
+
+def test_add_moves_booking_between_rooms():
+    occupancy = DayOccupancy([(1, 1, time(9), time(10))])
+    occupancy.add(1, 2, time(11), time(12))
+    assert not occupancy.is_booked(1, time(9), time(10))
+    assert occupancy.is_booked(2, time(11), time(12))
+
+
+# The day is loaded after the create commits but before booking_changed() patches it,
+# so the patch finds the booking already indexed; deleting it must leave the room free
+def test_load_between_commit_and_patch():
+    index = OccupancyIndex()
+    booking = Slot(1, 1, DAY, time(9), time(10))
+    index._days[DAY] = DayOccupancy([(1, 1, time(9), time(10))])
+
+    index._apply(None, booking)
+    assert index._days[DAY].rooms[1] == [(time(9), time(10), 1)]
+
+    index._apply(booking, None)
+    assert not index._days[DAY].is_booked(1, time(9), time(10))
+
+
+def test_version_reads_add_no_entries():
+    index = OccupancyIndex()
+    for offset in range(1000):
+        index.version(date.fromordinal(DAY.toordinal() + offset))
+    assert index._versions == {}
+
+
+# An ETag taken before a write must not match again once the day has been evicted
+def test_version_never_repeats_after_eviction():
+    index = OccupancyIndex(max_days=1)
+    other = date(2030, 1, 8)
+    index._days[DAY] = DayOccupancy()
+    index._versions[DAY] = index.version(DAY)
+    before = index.version(DAY)
+
+    index._apply(None, Slot(1, 1, DAY, time(9), time(10)))
+    after_write = index.version(DAY)
+    assert after_write != before
+
+    index._evict(DAY)
+    index._bump(other)
+    assert index.version(DAY) not in (before, after_write)
+    assert index._versions == {}
+
+
+def test_cached_day_expires_after_ttl():
+    index = OccupancyIndex(ttl=0)
+    index._days[DAY] = DayOccupancy([(1, 1, time(9), time(10))])
+    index._loaded_at[DAY] = 0
+    index._versions[DAY] = before = 0
+
+    assert index.version(DAY) != before
+    assert DAY not in index._days